@@ -0,0 +1,44 @@
+# services/auth/apps/users/chat_client.py
+from django.conf import settings
+from django.db import transaction
+from . import http_client
+from .jwt_service import ServiceJWT
+
+
+class ChatServiceClient:
+    """Клиент для внутренних запросов к Chat Service с JWT аутентификацией"""
+
+    def __init__(self):
+        self.base_url = settings.CHAT_SERVICE_URL
+        self.service_name = 'auth-service'
+
+    def _get_headers(self):
+        token = ServiceJWT.get_service_token(self.service_name, expires_minutes=5)
+        return {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+
+    def invalidate_profiles(self, user_ids) -> bool:
+        """Сбросить снимки профилей в кэше чата"""
+        try:
+            response = http_client.post(
+                f"{self.base_url}/api/chat/internal/profiles/invalidate/",
+                endpoint='chat.invalidate_profiles',
+                headers=self._get_headers(),
+                json={'user_ids': [str(user_id) for user_id in user_ids]}
+            )
+
+            if response.status_code == 200:
+                return True
+
+            print(f"[ChatClient] Ошибка: {response.status_code} - {response.text}")
+            return False
+        except Exception as e:
+            print(f"[ChatClient] Исключение: {e}")
+            return False
+
+
+def publish_profile_changed(user_id) -> None:
+    """Сообщить чату об изменении имени или настроек Telegram после коммита транзакции"""
+    transaction.on_commit(lambda: ChatServiceClient().invalidate_profiles([user_id]))
@@ -0,0 +1,122 @@
+# services/auth/apps/users/http_client.py
+"""
+HTTP-клиент для межсервисных запросов.
+
+Одна requests.Session на хост: keep-alive и пул соединений вместо нового
+TCP-соединения на каждый вызов. Таймауты и повторы берутся из настроек
+INTERNAL_HTTP_*; ответы 502/503/504 повторяются только для GET/HEAD,
+ошибки соединения - для любых методов (запрос до сервера не дошел).
+Для каждого endpoint копятся метрики (число вызовов, ошибок и задержки);
+раз в INTERNAL_HTTP_METRICS_INTERVAL секунд процесс пишет их сводку в лог
+и начинает новое окно.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+_window_started = time.monotonic()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=settings.INTERNAL_HTTP_RETRIES,
+        connect=settings.INTERNAL_HTTP_RETRIES,
+        read=0,
+        status=settings.INTERNAL_HTTP_RETRIES,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.INTERNAL_HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """Сессия с пулом соединений для хоста из url"""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _sessions[host] = _build_session()
+    return session
+
+
+def request(method: str, url: str, endpoint: str = '', timeout=None, **kwargs) -> requests.Response:
+    """
+    Выполнить запрос через пул соединений.
+    endpoint - стабильное имя для метрик (без id в пути), по умолчанию хост.
+    Исключения requests пробрасываются вызывающему коду, как и раньше.
+    """
+    if timeout is None:
+        timeout = (settings.INTERNAL_HTTP_CONNECT_TIMEOUT, settings.INTERNAL_HTTP_READ_TIMEOUT)
+    endpoint = endpoint or urlsplit(url).netloc
+
+    started = time.monotonic()
+    try:
+        response = get_session(url).request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        _record(endpoint, time.monotonic() - started, error=True)
+        raise
+
+    _record(endpoint, time.monotonic() - started, error=response.status_code >= 500)
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def _record(endpoint: str, elapsed: float, error: bool) -> None:
+    global _metrics, _window_started
+
+    elapsed_ms = elapsed * 1000
+    now = time.monotonic()
+    with _metrics_lock:
+        stats = _metrics.setdefault(endpoint, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['errors'] += int(error)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+        window = now - _window_started
+        if window < settings.INTERNAL_HTTP_METRICS_INTERVAL:
+            return
+        finished, _metrics, _window_started = _metrics, {}, now
+
+    _log_metrics(finished, window)
+
+
+def _log_metrics(metrics: dict, window: float) -> None:
+    """Сводка по endpoint за закончившееся окно"""
+    for endpoint, stats in sorted(metrics.items()):
+        print(
+            f"📊 HTTP {endpoint} за {window:.0f}с: {stats['count']} запросов, "
+            f"ошибок {stats['errors']}, "
+            f"среднее {stats['total_ms'] / stats['count']:.1f} мс, макс {stats['max_ms']:.1f} мс"
+        )
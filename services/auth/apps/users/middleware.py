@@ -1,11 +1,19 @@
+import threading
+import time
+from collections import OrderedDict
 from django.http import JsonResponse
 from .jwt_service import ServiceJWT
 
 class InternalServiceMiddleware:
     """Middleware для проверки JWT токенов внутренних сервисов"""
+
+    # Сервисы переиспользуют токены, поэтому проверенный payload кэшируется до exp
+    VERIFIED_CACHE_SIZE = 256
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
     
     def __call__(self, request):
         # Проверяем только internal эндпоинты
@@ -19,7 +27,7 @@ class InternalServiceMiddleware:
                 }, status=403)
             
             token = auth_header.replace('Bearer ', '')
-            payload = ServiceJWT.verify_service_token(token)
+            payload = self._verify_token(token)
             
             if not payload:
                 return JsonResponse({
@@ -31,3 +39,22 @@ class InternalServiceMiddleware:
             request.service_name = payload.get('service')
         
         return self.get_response(request)
+
+    def _verify_token(self, token):
+        """Проверка токена с LRU-кэшем уже проверенных подписей"""
+        with self._lock:
+            payload = self._verified.get(token)
+            if payload is not None:
+                if payload.get('exp', 0) > time.time():
+                    self._verified.move_to_end(token)
+                    return payload
+                del self._verified[token]
+
+        payload = ServiceJWT.verify_service_token(token)
+        if payload and 'exp' in payload:
+            with self._lock:
+                self._verified[token] = payload
+                self._verified.move_to_end(token)
+                if len(self._verified) > self.VERIFIED_CACHE_SIZE:
+                    self._verified.popitem(last=False)
+        return payload
@@ -45,6 +45,7 @@ urlpatterns = [
     path('users/<uuid:user_id>/', PublicProfileView.as_view(), name='public_profile'),
     path('subscription/', SubscriptionView.as_view(), name='subscription'),
     path('internal/users/<uuid:user_id>/profile/', views.InternalUserProfileView.as_view(), name='internal-user-profile'),
+    path('internal/users/profiles/', views.InternalUserProfilesBatchView.as_view(), name='internal-user-profiles-batch'),
     path('telegram/generate-link/', TelegramGenerateLinkView.as_view(), name='telegram_generate_link'),
     path('telegram/verify-token/', TelegramVerifyTokenView.as_view(), name='telegram_verify_token'),
     path('telegram/disconnect/', TelegramDisconnectView.as_view(), name='telegram_disconnect'),
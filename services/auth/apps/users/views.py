@@ -14,6 +14,8 @@ from .serializers import (
     SubscriptionSerializer
 )
 from .services import AuthService
+from . import http_client
+from .chat_client import publish_profile_changed
 from .models import (
     User, Subscription, SubscriptionPayment, Service, TelegramLinkToken, 
     Profile, LoginAttempt, EmailVerification, PasswordResetToken
@@ -28,9 +30,9 @@ from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
-import requests
 import os
 import secrets
+import uuid
 from django.core.mail import send_mail
 
 
@@ -84,8 +86,9 @@ def verify_recaptcha(token):
         return True
     
     try:
-        response = requests.post(
+        response = http_client.post(
             'https://www.google.com/recaptcha/api/siteverify',
+            endpoint='recaptcha.siteverify',
             data={
                 'secret': secret_key,
                 'response': token
@@ -866,6 +869,7 @@ class ProfileView(APIView):
             
             if serializer.is_valid():
                 serializer.save()
+                publish_profile_changed(request.user.id)
                 
                 if 'avatar' in request.data or serializer.validated_data.get('avatar'):
                     avatar_url = request.build_absolute_uri(profile.avatar.url) if profile.avatar else ''
@@ -877,8 +881,9 @@ class ProfileView(APIView):
                         
                         update_url = f"{market_service_url}/api/market/services/update-owner-avatar/"
                         
-                        requests.post(
+                        http_client.post(
                             update_url,
+                            endpoint='market.update_owner_avatar',
                             headers={
                                 'Authorization': auth_header,
                                 'Content-Type': 'application/json'
@@ -886,8 +891,7 @@ class ProfileView(APIView):
                             json={
                                 'owner_id': str(request.user.id),
                                 'owner_avatar': avatar_url
-                            },
-                            timeout=5
+                            }
                         )
                     except Exception as e:
                         print(f"⚠️ Не удалось обновить аватар в объявлениях: {e}")
@@ -1148,6 +1152,7 @@ class TelegramVerifyTokenView(APIView):
             profile.telegram_chat_id = telegram_chat_id
             profile.telegram_notifications_enabled = True
             profile.save()
+            publish_profile_changed(link_token.user_id)
             
             link_token.used = True
             link_token.save()
@@ -1178,6 +1183,7 @@ class TelegramDisconnectView(APIView):
             profile.telegram_chat_id = None
             profile.telegram_notifications_enabled = False
             profile.save()
+            publish_profile_changed(request.user.id)
             
             return Response({
                 'status': 'success',
@@ -1228,6 +1234,24 @@ class TelegramGetUserByIdView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _internal_profile_data(user) -> dict:
+    """Профиль и настройки уведомлений для внутренних эндпоинтов"""
+    profile_data = {}
+    if hasattr(user, 'profile'):
+        profile_data = {
+            'full_name': user.profile.full_name,
+            'company_name': user.profile.company_name,
+            'telegram_chat_id': user.profile.telegram_chat_id,
+            'telegram_notifications_enabled': user.profile.telegram_notifications_enabled,
+        }
+
+    return {
+        'id': str(user.id),
+        'email': user.email,
+        'profile': profile_data
+    }
+
+
 class InternalUserProfileView(APIView):
     """Внутренний эндпоинт для получения профиля (защищен JWT middleware)"""
     authentication_classes = []
@@ -1237,25 +1261,45 @@ class InternalUserProfileView(APIView):
         try:
             user = User.objects.select_related('profile').get(id=user_id)
             
-            profile_data = {}
-            if hasattr(user, 'profile'):
-                profile_data = {
-                    'full_name': user.profile.full_name,
-                    'company_name': user.profile.company_name,
-                    'telegram_chat_id': user.profile.telegram_chat_id,
-                    'telegram_notifications_enabled': user.profile.telegram_notifications_enabled,
-                }
-            
             return Response({
                 'status': 'success',
-                'data': {
-                    'id': str(user.id),
-                    'email': user.email,
-                    'profile': profile_data
-                }
+                'data': _internal_profile_data(user)
             })
         except User.DoesNotExist:
             return Response({
                 'status': 'error',
                 'error': 'User not found'
             }, status=404)
+
+
+class InternalUserProfilesBatchView(APIView):
+    """
+    Внутренний эндпоинт: профили пачки пользователей одним запросом
+    (защищен JWT middleware). Неизвестные и некорректные ID пропускаются.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    MAX_USER_IDS = 100
+
+    def post(self, request):
+        user_ids = request.data.get('user_ids', [])
+        if not isinstance(user_ids, list) or len(user_ids) > self.MAX_USER_IDS:
+            return Response({
+                'status': 'error',
+                'error': f'user_ids must be a list of at most {self.MAX_USER_IDS} ids'
+            }, status=400)
+
+        valid_ids = set()
+        for user_id in user_ids:
+            try:
+                valid_ids.add(uuid.UUID(str(user_id)))
+            except ValueError:
+                continue
+
+        users = User.objects.select_related('profile').filter(id__in=valid_ids)
+
+        return Response({
+            'status': 'success',
+            'data': [_internal_profile_data(user) for user in users]
+        })
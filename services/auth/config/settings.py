@@ -156,3 +156,12 @@ USE_I18N = True
 USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+CHAT_SERVICE_URL = os.getenv('CHAT_SERVICE_URL', 'http://localhost:8003')
+
+# Межсервисные HTTP-запросы (пул соединений, см. http_client.py)
+INTERNAL_HTTP_CONNECT_TIMEOUT = float(os.getenv('INTERNAL_HTTP_CONNECT_TIMEOUT', '2'))
+INTERNAL_HTTP_READ_TIMEOUT = float(os.getenv('INTERNAL_HTTP_READ_TIMEOUT', '5'))
+INTERNAL_HTTP_RETRIES = int(os.getenv('INTERNAL_HTTP_RETRIES', '2'))
+INTERNAL_HTTP_POOL_SIZE = int(os.getenv('INTERNAL_HTTP_POOL_SIZE', '10'))
+INTERNAL_HTTP_METRICS_INTERVAL = int(os.getenv('INTERNAL_HTTP_METRICS_INTERVAL', '300'))
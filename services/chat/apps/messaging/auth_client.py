@@ -1,5 +1,5 @@
 import os
-import requests
+from . import http_client
 from .jwt_service import ServiceJWT
 
 class AuthServiceClient:
@@ -11,7 +11,7 @@ class AuthServiceClient:
     
     def _get_headers(self):
         """Получить headers с JWT токеном"""
-        token = ServiceJWT.generate_service_token(self.service_name)
+        token = ServiceJWT.get_service_token(self.service_name)
         return {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
@@ -20,10 +20,10 @@ class AuthServiceClient:
     def get_user_profile(self, user_id):
         """Получить профиль пользователя"""
         try:
-            response = requests.get(
+            response = http_client.get(
                 f"{self.base_url}/api/auth/internal/users/{user_id}/profile/",
-                headers=self._get_headers(),
-                timeout=5
+                endpoint='auth.internal_user_profile',
+                headers=self._get_headers()
             )
             
             if response.status_code == 200:
@@ -34,3 +34,29 @@ class AuthServiceClient:
         except Exception as e:
             print(f"[AuthClient] Исключение: {e}")
             return None
+
+    def get_user_profiles(self, user_ids):
+        """
+        Получить профили нескольких пользователей одним запросом: {user_id: profile}.
+        Возвращает None, если Auth Service не ответил.
+        """
+        user_ids = sorted({str(user_id) for user_id in user_ids if user_id})
+        if not user_ids:
+            return {}
+
+        try:
+            response = http_client.post(
+                f"{self.base_url}/api/auth/internal/users/profiles/",
+                endpoint='auth.internal_user_profiles',
+                headers=self._get_headers(),
+                json={'user_ids': user_ids}
+            )
+
+            if response.status_code == 200:
+                return {item['id']: item for item in response.json().get('data', [])}
+
+            print(f"[AuthClient] Ошибка: {response.status_code} - {response.text}")
+            return None
+        except Exception as e:
+            print(f"[AuthClient] Исключение: {e}")
+            return None
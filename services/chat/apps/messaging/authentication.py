@@ -1,6 +1,8 @@
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 import jwt as pyjwt
+from .jwt_service import ServiceJWT
 
 
 class RemoteUser:
@@ -38,3 +40,47 @@ class RemoteJWTAuthentication(JWTAuthentication):
     """
     def get_user(self, validated_token):
         return RemoteUser(validated_token)
+
+
+class ServiceUser:
+    """
+    Системный пользователь внутреннего сервиса (market и др.).
+    Своего user_id у него нет - автор сообщения передается в запросе.
+    """
+    id = None
+    pk = None
+    role = 'system'
+    is_authenticated = True
+    is_active = True
+    is_staff = True
+    is_superuser = False
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.email = f'system@{service_name}.internal'
+
+    def __str__(self):
+        return f"ServiceUser({self.service_name})"
+
+
+class ServiceJWTAuthentication(BaseAuthentication):
+    """
+    Аутентификация межсервисных запросов токеном ServiceJWT
+    (отдельный секрет SERVICE_JWT_SECRET, type='service').
+    """
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid authorization header')
+
+        payload = ServiceJWT.verify_service_token(auth[1].decode())
+        if not payload or not payload.get('service'):
+            raise AuthenticationFailed('Invalid or expired service token')
+        return ServiceUser(payload['service']), payload
+
+    def authenticate_header(self, request):
+        return 'Bearer'
@@ -0,0 +1,55 @@
+# services/chat/apps/messaging/broadcast.py
+"""
+Рассылка WebSocket-кадров о сообщениях.
+
+Кадр уходит в группу комнаты (chat_<room_id>, открытый чат) и в личные
+группы участников (user_<user_id>, одно соединение пользователя на все
+его комнаты - список чатов, счетчики). Кадр кодируется один раз
+отправителем, консьюмеры только пересылают его.
+Изменения счетчиков непрочитанных уходят только в личные группы.
+"""
+from typing import Dict, Iterable
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from .message_payload import encode
+
+
+def room_group(room_id) -> str:
+    return f'chat_{room_id}'
+
+
+def user_group(user_id) -> str:
+    return f'user_{user_id}'
+
+
+async def send_frame(channel_layer, room_id, member_ids: Iterable, handler: str, frame: str) -> None:
+    """Отправить готовый кадр в группу комнаты и личные группы участников"""
+    event = {'type': handler, 'frame': frame}
+    await channel_layer.group_send(room_group(room_id), event)
+    for user_id in member_ids:
+        await channel_layer.group_send(user_group(user_id), event)
+
+
+def send_frame_sync(room_id, member_ids: Iterable, handler: str, frame: str) -> None:
+    """То же из синхронного кода (REST-представления)"""
+    async_to_sync(send_frame)(get_channel_layer(), room_id, member_ids, handler, frame)
+
+
+def unread_frame(room_id, unread_count: int, delta: int) -> str:
+    return encode({
+        'type': 'unread',
+        'data': {'room_id': str(room_id), 'unread_count': unread_count, 'delta': delta},
+    })
+
+
+async def send_unread(channel_layer, room_id, counters: Dict[str, int], delta: int) -> None:
+    """Отправить получателям новое значение счетчика комнаты и его изменение"""
+    for user_id, unread_count in counters.items():
+        await channel_layer.group_send(
+            user_group(user_id),
+            {'type': 'unread_update', 'frame': unread_frame(room_id, unread_count, delta)}
+        )
+
+
+def send_unread_sync(room_id, counters: Dict[str, int], delta: int) -> None:
+    async_to_sync(send_unread)(get_channel_layer(), room_id, counters, delta)
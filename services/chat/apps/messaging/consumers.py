@@ -3,8 +3,10 @@ import json
 import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Room, Message, MessageAttachment
-from .notification_service import TelegramNotificationService
+from django.db import transaction
+from .models import Message, MessageAttachment
+from django.core.exceptions import ValidationError
+from . import broadcast, membership, message_payload, notification_queue, unread_counters
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -23,7 +25,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close(code=4003)  # Forbidden
             return
         
-        self.room_group_name = f'chat_{self.room_id}'
+        self.room_group_name = broadcast.room_group(self.room_id)
         self.user_id = str(user.id)
         
         await self.channel_layer.group_add(
@@ -53,7 +55,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             text = data.get('text', '')
             attachments = data.get('attachments', [])
 
-            message = await self.save_message(
+            serialized, member_ids, unread = await self.save_message(
                 room_id=self.room_id,
                 sender_id=self.user_id,
                 text=text,
@@ -61,134 +63,123 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 attachment_ids=attachments
             )
 
-            # Отправка Telegram уведомления
-            await self.send_telegram_notification(message, self.user_id)
-
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': await self.serialize_message(message)
-                }
+            await broadcast.send_frame(
+                self.channel_layer, self.room_id, member_ids,
+                'chat_message', message_payload.frame('message', serialized)
             )
+            await broadcast.send_unread(self.channel_layer, self.room_id, unread, delta=1)
 
     async def chat_message(self, event):
-        """Обработчик для отправки новых сообщений клиентам"""
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'data': event['message']
-        }))
+        """Обработчик для отправки новых сообщений клиентам (кадр закодирован отправителем)"""
+        await self.send(text_data=event['frame'])
     
     async def message_updated(self, event):
-        """Обработчик для обновления существующих сообщений"""
-        await self.send(text_data=json.dumps({
-            'type': 'message_updated',
-            'data': event['message']
-        }))
+        """Обработчик для обновления существующих сообщений (кадр закодирован отправителем)"""
+        await self.send(text_data=event['frame'])
 
     @database_sync_to_async
     def check_room_membership(self, user_id, room_id):
         """Проверить, что пользователь - участник чата"""
         try:
-            room = Room.objects.get(id=room_id)
-            return str(user_id) in [str(m) for m in room.members]
-        except Room.DoesNotExist:
+            return membership.is_member(room_id, user_id)
+        except ValidationError:
+            # room_id из URL - не UUID
             return False
 
     @database_sync_to_async
     def save_message(self, room_id, sender_id, text, message_type='text', deal_data=None, attachment_ids=None):
-        """Сохранить сообщение в БД и прикрепить файлы"""
-        room = Room.objects.get(id=room_id)
-        message = Message.objects.create(
-            room=room,
-            sender_id=sender_id,
-            text=text,
-            message_type=message_type,
-            deal_data=deal_data
-        )
-        
-        if attachment_ids:
-            for att_id in attachment_ids:
-                try:
-                    attachment = MessageAttachment.objects.get(id=att_id, message__isnull=True)
-                    attachment.message = message
-                    attachment.save()
-                except MessageAttachment.DoesNotExist:
-                    pass
+        """
+        Сохранить сообщение в БД и прикрепить файлы одной транзакцией:
+        INSERT сообщения (Message.save обновляет updated_at комнаты), один UPDATE,
+        забирающий свободные вложения, и одна выборка забранных вложений.
+        Комната не загружается - членство уже проверено в connect.
+        Возвращает сериализованное сообщение, участников комнаты для рассылки
+        и новые значения счетчиков непрочитанных у получателей.
+        """
+        with transaction.atomic():
+            message = Message.objects.create(
+                room_id=room_id,
+                sender_id=sender_id,
+                text=text,
+                message_type=message_type,
+                deal_data=deal_data
+            )
+
+            attachments = []
+            attachment_ids = self._valid_uuids(attachment_ids or [])
+            if attachment_ids:
+                claimed = MessageAttachment.objects.filter(
+                    id__in=attachment_ids, message__isnull=True
+                ).update(message=message)
+                if claimed:
+                    attachments = list(MessageAttachment.objects.filter(message=message))
+
+            member_ids = membership.member_ids(room_id)
+            # Telegram-уведомления отправит воркер очереди, рассылку в группу они не задерживают
+            notification_queue.enqueue(message, member_ids)
         
-        return message
+        unread = unread_counters.increment(room_id, set(member_ids) - {str(sender_id)})
 
-    @database_sync_to_async
-    def serialize_message(self, message):
-        """Сериализация сообщения для отправки"""
-        attachments = []
-        for att in message.attachments.all():
-            file_url = att.get_file_url()
-            if not file_url:
+        # Вложения уже в памяти - сериализация не делает повторный запрос
+        return message_payload.serialize_message(message, attachments), member_ids, unread
+
+    @staticmethod
+    def _valid_uuids(values):
+        """id вложений от клиента; некорректные пропускаются, как и раньше несуществующие"""
+        valid = []
+        for value in values:
+            try:
+                valid.append(uuid.UUID(str(value)))
+            except ValueError:
                 continue
-            
-            if not file_url.startswith('http'):
-                file_url = f"http://localhost:8003{file_url}"
-            
-            attachments.append({
-                'id': str(att.id),
-                'name': att.filename,
-                'filename': att.filename,
-                'size': att.file_size,
-                'file_size': att.file_size,
-                'content_type': att.content_type,
-                'url': file_url,
-                'display_mode': att.display_mode
-            })
-        
-        return {
-            'id': str(message.id),
-            'room_id': str(message.room_id),
-            'sender_id': str(message.sender_id),
-            'text': message.text,
-            'message_type': message.message_type,
-            'deal_data': message.deal_data,
-            'attachments': attachments,
-            'created_at': message.created_at.isoformat(),
-        }
-    
-    @database_sync_to_async
-    def get_room_members(self, message):
-        """Получить членов комнаты"""
-        return message.room.members
-    
-    async def send_telegram_notification(self, message, sender_id):
-        """
-        Отправка Telegram уведомления через централизованный сервис
-        """
-        try:
-            print(f"[TELEGRAM] 🔔 Отправка уведомления о сообщении {message.id}")
-            
-            # Получаем участников комнаты
-            members = await self.get_room_members(message)
-            
-            # Используем сервис уведомлений
-            notification_service = TelegramNotificationService()
-            
-            # Отправляем синхронно (т.к. внутри уже requests)
-            success = await self.run_in_executor(
-                notification_service.send_notification,
-                message,
-                sender_id,
-                members
+        return valid
+
+
+class UserConsumer(AsyncWebsocketConsumer):
+    """
+    Одно соединение пользователя на все его комнаты (ws/user/): новые
+    сообщения и обновления карточек заказов из всех комнат пользователя,
+    изменения счетчиков непрочитанных (кадры unread).
+    Кадры сообщений те же, что в ChatConsumer, комнату определяет data.room_id.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4001)
+            return
+
+        self.user_id = str(user.id)
+        self.user_group_name = broadcast.user_group(self.user_id)
+
+        await self.channel_layer.group_add(
+            self.user_group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'user_group_name'):
+            await self.channel_layer.group_discard(
+                self.user_group_name,
+                self.channel_name
             )
-            
-            if success:
-                print(f"[TELEGRAM] ✅ Уведомление успешно отправлено")
-            else:
-                print(f"[TELEGRAM] ⚠️ Уведомление не отправлено")
-            
-        except Exception as e:
-            print(f"[TELEGRAM] ⚠️ Ошибка отправки уведомления: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    @database_sync_to_async
-    def run_in_executor(self, func, *args):
-        """Запустить синхронную функцию в executor"""
-        return func(*args)
+
+    async def receive(self, text_data):
+        """Соединение только для получения; ping позволяет клиенту проверить его"""
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            return
+        if isinstance(data, dict) and data.get('type') == 'ping':
+            await self.send(text_data='{"type":"pong"}')
+
+    async def chat_message(self, event):
+        await self.send(text_data=event['frame'])
+
+    async def message_updated(self, event):
+        await self.send(text_data=event['frame'])
+
+    async def unread_update(self, event):
+        await self.send(text_data=event['frame'])
@@ -1,5 +1,6 @@
 import jwt
 import os
+import threading
 from datetime import datetime, timedelta
 from django.conf import settings
 
@@ -9,6 +10,11 @@ class ServiceJWT:
     # Отдельный секрет для межсервисных токенов
     SECRET_KEY = os.getenv('SERVICE_JWT_SECRET', settings.SECRET_KEY + '-service-jwt-secure')
     ALGORITHM = 'HS256'
+
+    # Подписанный токен переиспользуется, пока до истечения больше TOKEN_REFRESH_MARGIN
+    TOKEN_REFRESH_MARGIN = timedelta(seconds=60)
+    _token_cache = {}
+    _token_lock = threading.Lock()
     
     @classmethod
     def generate_service_token(cls, service_name, expires_minutes=60):
@@ -23,3 +29,38 @@ class ServiceJWT:
             'iat': datetime.utcnow(),
         }
         return jwt.encode(payload, cls.SECRET_KEY, algorithm=cls.ALGORITHM)
+
+    @classmethod
+    def get_service_token(cls, service_name, expires_minutes=60):
+        """Токен сервиса из кэша процесса; новый подписывается незадолго до истечения старого"""
+        key = (service_name, expires_minutes)
+        cached = cls._token_cache.get(key)
+        if cached and cached[1] - datetime.utcnow() > cls.TOKEN_REFRESH_MARGIN:
+            return cached[0]
+
+        with cls._token_lock:
+            cached = cls._token_cache.get(key)
+            if cached and cached[1] - datetime.utcnow() > cls.TOKEN_REFRESH_MARGIN:
+                return cached[0]
+
+            # Срок фиксируется до подписи, поэтому он не позже реального exp токена
+            expires_at = datetime.utcnow() + timedelta(minutes=expires_minutes)
+            token = cls.generate_service_token(service_name, expires_minutes=expires_minutes)
+            cls._token_cache[key] = (token, expires_at)
+            return token
+
+    @classmethod
+    def verify_service_token(cls, token):
+        """Проверка токена"""
+        try:
+            payload = jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM])
+
+            # Проверяем что это service токен
+            if payload.get('type') != 'service':
+                return None
+
+            return payload
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
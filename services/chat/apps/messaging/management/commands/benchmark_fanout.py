@@ -0,0 +1,110 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ...message_payload import frame, orjson, serialize_message
+from ...models import Message, MessageAttachment
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _sample_message():
+    """Типичное сообщение со сделкой и вложениями (без обращения к БД)"""
+    now = timezone.now()
+    message = Message(
+        id=uuid.uuid4(),
+        room_id=uuid.uuid4(),
+        sender_id=uuid.uuid4(),
+        text='Здравствуйте! Отправляю материалы по заказу, посмотрите, пожалуйста. ' * 3,
+        message_type='text',
+        deal_data={
+            'deal_id': str(uuid.uuid4()),
+            'title': 'Разработка лендинга',
+            'price': '15000.00',
+            'status': 'in_progress',
+            'actions': ['complete', 'dispute'],
+        },
+        created_at=now,
+    )
+    attachments = [
+        MessageAttachment(
+            id=uuid.uuid4(),
+            filename=f'document_{index}.pdf',
+            file_size=1024 * 512,
+            content_type='application/pdf',
+            external_url=f'https://cdn.example.com/files/{uuid.uuid4()}.pdf',
+            display_mode='attachment',
+            created_at=now,
+        )
+        for index in range(5)
+    ]
+    return message, attachments
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарк рассылки сообщения в группу: кодирование кадра '
+        'в каждом консьюмере против готового кадра от отправителя'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[2, 50, 500],
+            help='Размеры групп (число подключенных сокетов)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Сколько рассылок измерять для каждого размера группы',
+        )
+
+    def handle(self, *args, **options):
+        message, attachments = _sample_message()
+        serialized = serialize_message(message, attachments, media_base_url='http://localhost:8003')
+
+        self.stdout.write(
+            f"Кодировщик: {'orjson' if orjson is not None else 'json'}, "
+            f"channel layer: {'msgpack' if msgpack is not None else 'без сериализации (msgpack не установлен)'}"
+        )
+        self.stdout.write(f"{'Группа':>8} {'Было, мс':>12} {'Стало, мс':>12} {'Ускорение':>10}")
+
+        for size in options['sizes']:
+            before = self._measure(self._per_consumer_encoding, serialized, size, options['iterations'])
+            after = self._measure(self._pre_encoded, serialized, size, options['iterations'])
+            self.stdout.write(f"{size:>8} {before:>12.3f} {after:>12.3f} {before / after:>9.1f}x")
+
+    def _measure(self, broadcast, serialized, size, iterations) -> float:
+        """Среднее время одной рассылки в группу из size сокетов, мс"""
+        started = time.perf_counter()
+        for _ in range(iterations):
+            broadcast(serialized, size)
+        return (time.perf_counter() - started) * 1000 / iterations
+
+    @staticmethod
+    def _transport(event, size):
+        """Доставка события channel layer: упаковка один раз, распаковка в каждом консьюмере"""
+        if msgpack is None:
+            return [event] * size
+        packed = msgpack.packb(event)
+        return [msgpack.unpackb(packed) for _ in range(size)]
+
+    def _per_consumer_encoding(self, serialized, size):
+        # Прежняя схема: в событии словарь, каждый консьюмер кодирует кадр сам
+        event = {'type': 'chat_message', 'message': serialized.data}
+        for received in self._transport(event, size):
+            json.dumps({'type': 'message', 'data': received['message']})
+
+    def _pre_encoded(self, serialized, size):
+        # Текущая схема: кадр закодирован отправителем, консьюмеры пересылают текст
+        event = {'type': 'chat_message', 'frame': frame('message', serialized)}
+        for received in self._transport(event, size):
+            received['frame']
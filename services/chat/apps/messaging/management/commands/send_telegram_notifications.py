@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from ...notification_queue import process_due
+
+
+class Command(BaseCommand):
+    help = 'Отправить Telegram-уведомления из очереди (воркер; можно запускать несколько)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Пауза, когда очередь пуста, в секундах (для --loop)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Сколько уведомлений забирать за один проход',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = process_due(options['batch_size'])
+            if stats or not options['loop']:
+                summary = ', '.join(f'{outcome}={count}' for outcome, count in sorted(stats.items()))
+                self.stdout.write(self.style.SUCCESS(f'Уведомления: {summary or "очередь пуста"}'))
+            if not options['loop']:
+                return
+            if not stats:
+                time.sleep(options['interval'])
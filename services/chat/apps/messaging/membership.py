@@ -0,0 +1,110 @@
+# services/chat/apps/messaging/membership.py
+"""
+Участники комнат.
+
+Room.members остается в API, но все поиски идут по таблице RoomMember
+(уникальный индекс (user_id, room)), а комната пары находится по
+уникальному Room.pair_key вместо двух JSON-фильтров по members.
+
+Проверка членства кэшируется в два уровня: в памяти процесса (только
+положительные ответы, короткий TTL - сбросить их в других процессах
+нельзя) и в Redis (оба ответа, сбрасываются при создании комнаты и
+изменении состава). Переподключения WebSocket и REST-запросы к комнате
+обходятся без запроса к БД.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from .models import Room, RoomMember
+
+KEY_PREFIX = 'room_member'
+MEMBERS_KEY_PREFIX = 'room_members'
+LOCAL_CACHE_SIZE = 10000
+
+# (room_id, user_id) -> время, до которого членство считается подтвержденным
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _key(room_id, user_id) -> str:
+    return f"{KEY_PREFIX}:{room_id}:{user_id}"
+
+
+def is_member(room_id, user_id) -> bool:
+    """Проверить, что пользователь - участник комнаты (кэш процесса, Redis, затем индекс)"""
+    local_key = (str(room_id), str(user_id))
+    with _local_lock:
+        expires_at = _local.get(local_key)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                _local.move_to_end(local_key)
+                return True
+            del _local[local_key]
+
+    key = _key(room_id, user_id)
+    cached = cache.get(key)
+    if cached is None:
+        cached = int(RoomMember.objects.filter(room_id=room_id, user_id=user_id).exists())
+        cache.set(key, cached, settings.MEMBERSHIP_CACHE_TIMEOUT)
+
+    if cached:
+        with _local_lock:
+            _local[local_key] = time.monotonic() + settings.MEMBERSHIP_LOCAL_CACHE_SECONDS
+            _local.move_to_end(local_key)
+            if len(_local) > LOCAL_CACHE_SIZE:
+                _local.popitem(last=False)
+    return bool(cached)
+
+
+def member_ids(room_id) -> List[str]:
+    """id участников комнаты (для рассылки по личным группам); кэшируется в Redis"""
+    key = f"{MEMBERS_KEY_PREFIX}:{room_id}"
+    members = cache.get(key)
+    if members is None:
+        members = [
+            str(user_id)
+            for user_id in RoomMember.objects.filter(room_id=room_id).values_list('user_id', flat=True)
+        ]
+        cache.set(key, members, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return members
+
+
+def invalidate(room_id, user_ids: Iterable) -> None:
+    """Сбросить закэшированное членство после изменения состава комнаты"""
+    user_ids = [str(user_id) for user_id in user_ids]
+    cache.delete_many(
+        [_key(room_id, user_id) for user_id in user_ids] + [f"{MEMBERS_KEY_PREFIX}:{room_id}"]
+    )
+    with _local_lock:
+        for user_id in user_ids:
+            _local.pop((str(room_id), user_id), None)
+
+
+def rooms_of(user_id):
+    """Комнаты пользователя"""
+    return Room.objects.filter(memberships__user_id=user_id)
+
+
+def create_pair_room(user1_id, user2_id) -> Tuple[Room, bool]:
+    """
+    Комната двух пользователей: существующая или новая.
+    Одновременное создание одной пары упирается в уникальный pair_key -
+    проигравший запрос возвращает комнату победителя.
+    """
+    pair_key = Room.make_pair_key(user1_id, user2_id)
+    try:
+        with transaction.atomic():
+            room = Room.objects.create(members=[str(user1_id), str(user2_id)], pair_key=pair_key)
+            member_ids = {str(user1_id), str(user2_id)}
+            RoomMember.objects.bulk_create(
+                [RoomMember(room=room, user_id=user_id) for user_id in member_ids]
+            )
+            # Отрицательный ответ мог попасть в кэш, если клиент обращался к комнате до создания
+            transaction.on_commit(lambda: invalidate(room.id, member_ids))
+        return room, True
+    except IntegrityError:
+        return Room.objects.get(pair_key=pair_key), False
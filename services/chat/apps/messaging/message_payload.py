@@ -0,0 +1,91 @@
+# services/chat/apps/messaging/message_payload.py
+"""
+Единый формат сообщения для WebSocket-рассылки и HTTP-ответов.
+
+Сообщение сериализуется один раз из объектов в памяти (вложения берутся
+из prefetch-кэша или передаются явно) и сразу кодируется в JSON; эта же
+строка уходит и в группу channel layer, и в тело HTTP-ответа.
+Относительные URL файлов дополняются CHAT_PUBLIC_MEDIA_URL.
+
+Для рассылки в группу готовый WebSocket-кадр собирается один раз
+(frame) и кладется в событие channel layer: консьюмеры группы только
+пересылают текст, не кодируя его каждый заново. Если установлен orjson,
+JSON кодируется им.
+"""
+import json
+from typing import Dict, Iterable, NamedTuple, Optional
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него - стандартный json
+    orjson = None
+
+
+class SerializedMessage(NamedTuple):
+    data: Dict
+    json: str
+
+
+def encode(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def frame(frame_type: str, serialized: SerializedMessage) -> str:
+    """Готовый WebSocket-кадр {"type": frame_type, "data": <сообщение>}"""
+    return f'{{"type":{encode(frame_type)},"data":{serialized.json}}}'
+
+
+def _attachment_data(attachment, media_base_url: str) -> Optional[Dict]:
+    file_url = attachment.get_file_url()
+    if not file_url:
+        return None
+
+    if not file_url.startswith('http'):
+        file_url = f"{media_base_url}{file_url}"
+
+    return {
+        'id': str(attachment.id),
+        'name': attachment.filename,
+        'filename': attachment.filename,
+        'size': attachment.file_size,
+        'file_size': attachment.file_size,
+        'content_type': attachment.content_type,
+        'url': file_url,
+        'display_mode': attachment.display_mode,
+        'created_at': attachment.created_at.isoformat(),
+    }
+
+
+def serialize_message(message, attachments: Optional[Iterable] = None,
+                      media_base_url: Optional[str] = None) -> SerializedMessage:
+    """
+    Данные сообщения и их JSON. Без attachments вложения берутся из
+    message.attachments.all() - без запроса, если они уже в prefetch-кэше.
+    """
+    if attachments is None:
+        attachments = message.attachments.all()
+    media_base_url = (media_base_url or settings.CHAT_PUBLIC_MEDIA_URL).rstrip('/')
+
+    data = {
+        'id': str(message.id),
+        'room_id': str(message.room_id),
+        'sender_id': str(message.sender_id),
+        'text': message.text,
+        'message_type': message.message_type,
+        'deal_data': message.deal_data,
+        'attachments': [
+            item for item in (_attachment_data(att, media_base_url) for att in attachments) if item
+        ],
+        'created_at': message.created_at.isoformat(),
+    }
+    return SerializedMessage(data, encode(data))
+
+
+def success_response(serialized: SerializedMessage, message: str, status: int = 200) -> HttpResponse:
+    """Ответ {'status': 'success', 'data': ..., 'message': ...} с уже закодированными данными"""
+    body = f'{{"status":"success","data":{serialized.json},"message":{encode(message)}}}'
+    return HttpResponse(body, status=status, content_type='application/json')
@@ -3,8 +3,10 @@ from channels.db import database_sync_to_async
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
 from urllib.parse import parse_qs
 from .models import Room
+from .jwt_service import ServiceJWT
 
 
 class RemoteUser:
@@ -47,4 +49,31 @@ class JWTAuthMiddleware(BaseMiddleware):
             scope['user'] = AnonymousUser()
         
         return await super().__call__(scope, receive, send)
-    
\ No newline at end of file
+
+
+class InternalServiceMiddleware:
+    """Проверка JWT внутренних сервисов для /api/chat/internal/"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith('/api/chat/internal/'):
+            auth_header = request.headers.get('Authorization')
+
+            if not auth_header or not auth_header.startswith('Bearer '):
+                return JsonResponse({
+                    'status': 'error',
+                    'error': 'Missing or invalid authorization header'
+                }, status=403)
+
+            payload = ServiceJWT.verify_service_token(auth_header.replace('Bearer ', ''))
+            if not payload:
+                return JsonResponse({
+                    'status': 'error',
+                    'error': 'Invalid or expired service token'
+                }, status=403)
+
+            request.service_name = payload.get('service')
+
+        return self.get_response(request)
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0004_rename_messages_room_created_idx_messages_room_id_9d87cc_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelegramNotification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("receiver_id", models.UUIDField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("sent", "Отправлено"),
+                            ("skipped", "Не требуется"),
+                            ("failed", "Ошибка отправки"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "message",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="telegram_notifications",
+                        to="messaging.message",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "telegram_notifications",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"],
+                        name="telegram_no_status_62ca14_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="telegramnotification",
+            constraint=models.UniqueConstraint(
+                fields=("message", "receiver_id"),
+                name="unique_notification_per_receiver",
+            ),
+        ),
+    ]
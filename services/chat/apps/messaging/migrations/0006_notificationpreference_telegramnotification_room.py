@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_notification_rooms(apps, schema_editor):
+    TelegramNotification = apps.get_model("messaging", "TelegramNotification")
+    Message = apps.get_model("messaging", "Message")
+
+    TelegramNotification.objects.update(
+        room_id=models.Subquery(
+            Message.objects.filter(id=models.OuterRef("message_id")).values("room_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0005_telegramnotification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationPreference",
+            fields=[
+                ("user_id", models.UUIDField(primary_key=True, serialize=False)),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("instant", "Сразу (с объединением серий сообщений)"),
+                            ("digest", "Периодическая сводка"),
+                        ],
+                        default="instant",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "digest_interval_minutes",
+                    models.PositiveIntegerField(
+                        choices=[
+                            (15, "15 мин"),
+                            (60, "60 мин"),
+                            (180, "180 мин"),
+                            (720, "720 мин"),
+                            (1440, "1440 мин"),
+                        ],
+                        default=60,
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "notification_preferences",
+            },
+        ),
+        migrations.AddField(
+            model_name="telegramnotification",
+            name="digest",
+            field=models.BooleanField(
+                default=False, help_text="Отправить в периодической сводке"
+            ),
+        ),
+        migrations.AddField(
+            model_name="telegramnotification",
+            name="room",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="telegram_notifications",
+                to="messaging.room",
+            ),
+        ),
+        migrations.RunPython(backfill_notification_rooms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0006_notificationpreference_telegramnotification_room"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="telegramnotification",
+            name="room",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="telegram_notifications",
+                to="messaging.room",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="telegramnotification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sent", "Отправлено"),
+                    ("coalesced", "Объединено с другим уведомлением"),
+                    ("skipped", "Не требуется"),
+                    ("failed", "Ошибка отправки"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="telegramnotification",
+            index=models.Index(
+                fields=["receiver_id", "status"], name="telegram_no_receive_c42061_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:40
+
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def _canonical_id(member_id):
+    try:
+        return str(uuid.UUID(str(member_id)))
+    except ValueError:
+        return None
+
+
+def backfill_room_members(apps, schema_editor):
+    Room = apps.get_model("messaging", "Room")
+    RoomMember = apps.get_model("messaging", "RoomMember")
+
+    # Ключ пары получает самая активная из дублирующихся комнат
+    pair_rooms = {}
+    members_batch = []
+    rooms = Room.objects.order_by("-updated_at").values_list("id", "members")
+    for room_id, members in rooms.iterator(chunk_size=BATCH_SIZE):
+        member_ids = [_canonical_id(member_id) for member_id in members or []]
+        members_batch.extend(
+            RoomMember(room_id=room_id, user_id=user_id) for user_id in set(member_ids) if user_id
+        )
+        if len(members_batch) >= BATCH_SIZE:
+            RoomMember.objects.bulk_create(members_batch, ignore_conflicts=True)
+            members_batch = []
+
+        if len(member_ids) == 2 and all(member_ids):
+            pair_key = ":".join(sorted(member_ids))
+            pair_rooms.setdefault(pair_key, room_id)
+
+    RoomMember.objects.bulk_create(members_batch, ignore_conflicts=True)
+
+    for pair_key, room_id in pair_rooms.items():
+        Room.objects.filter(id=room_id).update(pair_key=pair_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0007_alter_telegramnotification_room"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="pair_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Канонический ключ пары участников (меньший id:больший id)",
+                max_length=73,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="RoomMember",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user_id", models.UUIDField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "room",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="memberships",
+                        to="messaging.room",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "room_members",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="roommember",
+            constraint=models.UniqueConstraint(
+                fields=("user_id", "room"), name="unique_room_member"
+            ),
+        ),
+        migrations.RunPython(backfill_room_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0008_room_pair_key_roommember"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="telegramnotification",
+            name="claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Аренда воркера: после нее строка возвращается в очередь",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="telegramnotification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sending", "Отправляется"),
+                    ("sent", "Отправлено"),
+                    ("coalesced", "Объединено с другим уведомлением"),
+                    ("skipped", "Не требуется"),
+                    ("failed", "Ошибка отправки"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
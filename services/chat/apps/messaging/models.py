@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 import os
 
 
@@ -13,11 +14,19 @@ def message_attachment_upload_path(instance, filename):
 
 class Room(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Список участников для API; для поиска и проверки членства - RoomMember
     members = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # Добавлено для сортировки
 
     deal_id = models.UUIDField(null=True, blank=True, db_index=True)
+    pair_key = models.CharField(
+        max_length=73,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Канонический ключ пары участников (меньший id:больший id)"
+    )
 
     class Meta:
         db_table = 'rooms'
@@ -28,6 +37,26 @@ class Room(models.Model):
     def __str__(self):
         return f"Room {self.id}"
 
+    @staticmethod
+    def make_pair_key(user1_id, user2_id) -> str:
+        return ':'.join(sorted([str(user1_id), str(user2_id)]))
+
+
+class RoomMember(models.Model):
+    """Участник комнаты: индексированные выборки комнат пользователя и проверка членства"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='memberships')
+    user_id = models.UUIDField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'room_members'
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'room'], name='unique_room_member')
+        ]
+
+    def __str__(self):
+        return f"RoomMember {self.user_id} in Room {self.room_id}"
+
 
 class Message(models.Model):
     MESSAGE_TYPES = [
@@ -49,12 +78,15 @@ class Message(models.Model):
     deal_data = models.JSONField(null=True, blank=True, help_text="Данные сделки для интерактивной карточки")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Карточки заказов обновляются на месте; по updated_at клиент догружает изменения после переподключения
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'messages'
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['room', '-created_at']),  # Индекс для последнего сообщения
+            models.Index(fields=['room', 'updated_at']),  # Изменения после переподключения (since)
         ]
 
     def __str__(self):
@@ -139,3 +171,76 @@ class MessageAttachment(models.Model):
         if self.file:
             return self.file.url
         return None
+
+
+class TelegramNotification(models.Model):
+    """
+    Очередь Telegram-уведомлений о новых сообщениях.
+    Отправляет воркер send_telegram_notifications; уникальность
+    (message, receiver_id) не дает поставить одно уведомление дважды.
+    Забранные воркером строки имеют статус sending до claimed_until.
+    Ожидающие уведомления одного получателя в одной комнате (или все его
+    уведомления в режиме сводки) отправляются одним сообщением.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('coalesced', 'Объединено с другим уведомлением'),
+        ('skipped', 'Не требуется'),
+        ('failed', 'Ошибка отправки'),
+    ]
+
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='telegram_notifications')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='telegram_notifications')
+    receiver_id = models.UUIDField()
+    digest = models.BooleanField(default=False, help_text="Отправить в периодической сводке")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_until = models.DateTimeField(
+        null=True, blank=True, help_text="Аренда воркера: после нее строка возвращается в очередь"
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'telegram_notifications'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['message', 'receiver_id'],
+                name='unique_notification_per_receiver'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['receiver_id', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.receiver_id} about Message {self.message_id} ({self.status})"
+
+
+class NotificationPreference(models.Model):
+    """Настройки Telegram-уведомлений пользователя в чате"""
+    MODE_CHOICES = [
+        ('instant', 'Сразу (с объединением серий сообщений)'),
+        ('digest', 'Периодическая сводка'),
+    ]
+    DIGEST_INTERVALS = [15, 60, 180, 720, 1440]
+
+    user_id = models.UUIDField(primary_key=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='instant')
+    digest_interval_minutes = models.PositiveIntegerField(
+        default=60,
+        choices=[(minutes, f'{minutes} мин') for minutes in DIGEST_INTERVALS]
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notification_preferences'
+
+    def __str__(self):
+        return f"NotificationPreference {self.mode} for {self.user_id}"
@@ -0,0 +1,252 @@
+# services/chat/apps/messaging/notification_queue.py
+"""
+Очередь Telegram-уведомлений.
+
+Обработка сообщения только ставит в очередь по строке TelegramNotification
+на каждого получателя - без запросов к Auth Service и Bot API. Отправляет
+воркер send_telegram_notifications: строки забираются короткой транзакцией
+(SELECT ... FOR UPDATE SKIP LOCKED) в статус sending с арендой
+TELEGRAM_CLAIM_LEASE_SECONDS, поэтому воркеров может быть несколько.
+Запросы к Auth Service и Telegram идут без открытой транзакции, а уже
+отправленное уведомление не откатывается ошибкой в другой группе.
+
+Серии сообщений объединяются: уведомление ждет TELEGRAM_COALESCE_SECONDS,
+и все ожидающие уведомления получателя в той же комнате уходят одним
+сообщением ("5 новых сообщений от ..."). В режиме сводки (NotificationPreference)
+уведомления копятся до границы интервала и отправляются одной сводкой
+по всем комнатам.
+
+Лимиты Telegram соблюдаются через Redis: не чаще одного сообщения в секунду
+в один чат и не больше TELEGRAM_GLOBAL_RATE_LIMIT сообщений в секунду на бота.
+"""
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import TelegramNotification, NotificationPreference, RoomMember
+from .notification_service import TelegramNotificationService, TelegramSendError
+from .profile_cache import ProfileServiceUnavailable
+
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 600
+RATE_LIMIT_DELAY = timedelta(seconds=1)
+
+
+def enqueue(message, members=None) -> int:
+    """
+    Поставить уведомления о сообщении всем участникам комнаты, кроме отправителя.
+    Если members не переданы, участники берутся из RoomMember.
+    """
+    if not os.getenv('TELEGRAM_BOT_TOKEN'):
+        return 0
+
+    if members is None:
+        members = RoomMember.objects.filter(room_id=message.room_id).values_list('user_id', flat=True)
+
+    receiver_ids = {str(member_id) for member_id in members} - {str(message.sender_id)}
+    if not receiver_ids:
+        return 0
+
+    digest_intervals = {
+        str(user_id): minutes
+        for user_id, minutes in NotificationPreference.objects.filter(
+            user_id__in=receiver_ids, mode='digest'
+        ).values_list('user_id', 'digest_interval_minutes')
+    }
+
+    now = timezone.now()
+    coalesce_until = now + timedelta(seconds=settings.TELEGRAM_COALESCE_SECONDS)
+    notifications = []
+    for receiver_id in receiver_ids:
+        minutes = digest_intervals.get(receiver_id)
+        notifications.append(TelegramNotification(
+            message=message,
+            room_id=message.room_id,
+            receiver_id=receiver_id,
+            digest=minutes is not None,
+            next_attempt_at=next_digest_at(now, minutes) if minutes else coalesce_until,
+        ))
+
+    TelegramNotification.objects.bulk_create(notifications, ignore_conflicts=True)
+    return len(notifications)
+
+
+def next_digest_at(now, interval_minutes: int):
+    """Ближайшая граница интервала сводки (по UTC), строго после now"""
+    interval = interval_minutes * 60
+    slot = (int(now.timestamp()) // interval + 1) * interval
+    return now + timedelta(seconds=slot - now.timestamp())
+
+
+def process_due(batch_size: int = 50) -> Counter:
+    """
+    Обработать пачку уведомлений, время отправки которых наступило.
+    Строки забираются короткой транзакцией (статус sending с арендой),
+    запросы к Auth Service и Telegram идут без открытой транзакции,
+    результат каждой группы фиксируется своей короткой транзакцией.
+    """
+    stats = Counter()
+    service = TelegramNotificationService()
+
+    for group in _claim(batch_size):
+        try:
+            outcome = _process(service, group)
+        except Exception as e:
+            # Группа не должна остаться в sending до конца аренды
+            print(f"[TELEGRAM] 🔥 Ошибка обработки уведомления {group[0].id}: {e}")
+            outcome = _retry(group, str(e))
+        stats[outcome] += 1
+        if outcome == 'sent':
+            stats['coalesced'] += len(group) - 1
+
+    return stats
+
+
+def _claim(batch_size: int) -> list:
+    """Забрать группы уведомлений для отправки: статус sending до конца аренды"""
+    now = timezone.now()
+    with transaction.atomic():
+        # Строки воркера, упавшего посреди отправки, возвращаются в очередь
+        TelegramNotification.objects.filter(status='sending', claimed_until__lt=now).update(
+            status='pending', claimed_until=None
+        )
+
+        heads = list(
+            TelegramNotification.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('message')
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('id')[:batch_size]
+        )
+        groups = []
+        claimed = set()
+        for head in heads:
+            if head.id in claimed:
+                continue
+            group = _lock_group(head, claimed)
+            claimed.update(item.id for item in group)
+            groups.append(group)
+
+        if claimed:
+            TelegramNotification.objects.filter(id__in=claimed).update(
+                status='sending',
+                claimed_until=now + timedelta(seconds=settings.TELEGRAM_CLAIM_LEASE_SECONDS),
+            )
+    return groups
+
+
+def _lock_group(head: TelegramNotification, claimed: set) -> list:
+    """
+    Ожидающие уведомления, которые уйдут вместе с head: той же комнаты
+    (или все уведомления сводки получателя), включая еще не наступившие.
+    """
+    group = (
+        TelegramNotification.objects
+        .select_for_update(skip_locked=True, of=('self',))
+        .select_related('message')
+        .filter(receiver_id=head.receiver_id, status='pending', digest=head.digest)
+        .exclude(id__in={head.id, *claimed})
+    )
+    if not head.digest:
+        group = group.filter(room_id=head.room_id)
+    return [head, *group.order_by('id')]
+
+
+def _process(service: TelegramNotificationService, group: list) -> str:
+    head = group[0]
+    messages = sorted((item.message for item in group), key=lambda message: message.created_at)
+
+    try:
+        built = service.build_notification(messages, str(head.receiver_id), digest=head.digest)
+    except ProfileServiceUnavailable as e:
+        return _retry(group, str(e))
+
+    if built is None:
+        _finish(group, 'skipped')
+        return 'skipped'
+
+    chat_id, text = built
+    if not _acquire_rate_limit(chat_id):
+        _defer(group, timezone.now() + RATE_LIMIT_DELAY)
+        return 'deferred'
+
+    try:
+        service.send_message(chat_id, text)
+    except TelegramSendError as e:
+        if e.permanent:
+            _finish(group, 'failed', str(e))
+            return 'failed'
+        return _retry(group, str(e), e.retry_after)
+
+    _finish(group, 'sent')
+    return 'sent'
+
+
+def _finish(group: list, status: str, error: str = '') -> None:
+    """Закрыть head со статусом status, остальные уведомления группы - как объединенные с ним"""
+    head, others = group[0], group[1:]
+    sent_at = timezone.now() if status == 'sent' else None
+
+    with transaction.atomic():
+        TelegramNotification.objects.filter(id=head.id).update(
+            status=status,
+            attempts=F('attempts') + (0 if status == 'skipped' else 1),
+            sent_at=sent_at,
+            last_error=error[:1000],
+            claimed_until=None,
+        )
+        if others:
+            TelegramNotification.objects.filter(id__in=[item.id for item in others]).update(
+                status='coalesced' if status == 'sent' else status,
+                sent_at=sent_at,
+                claimed_until=None,
+            )
+
+
+def _defer(group: list, next_attempt_at) -> None:
+    """Вернуть всю группу в очередь без попытки (лимит Telegram)"""
+    TelegramNotification.objects.filter(id__in=[item.id for item in group]).update(
+        status='pending', next_attempt_at=next_attempt_at, claimed_until=None
+    )
+
+
+def _retry(group: list, error: str, delay: Optional[int] = None) -> str:
+    """
+    Отложить всю группу с экспоненциальной паузой (или паузой из retry_after).
+    Группа возвращается в очередь целиком, чтобы ее уведомления не ушли
+    по отдельности раньше head или повторно.
+    """
+    head = group[0]
+    attempts = head.attempts + 1
+
+    if attempts >= MAX_ATTEMPTS:
+        _finish(group, 'failed', error)
+        print(f"[TELEGRAM] ❌ Уведомление {head.id} не отправлено: {error}")
+        return 'failed'
+
+    if delay is None:
+        delay = min(5 * 2 ** attempts, MAX_BACKOFF_SECONDS)
+    TelegramNotification.objects.filter(id__in=[item.id for item in group]).update(
+        status='pending',
+        attempts=attempts,
+        last_error=error[:1000],
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        claimed_until=None,
+    )
+    return 'retried'
+
+
+def _acquire_rate_limit(chat_id) -> bool:
+    """Слот отправки в чат chat_id с учетом лимитов Telegram"""
+    if not cache.add(f"telegram:rate:chat:{chat_id}", 1, timeout=1):
+        return False
+
+    global_key = f"telegram:rate:global:{int(time.time())}"
+    cache.add(global_key, 0, timeout=2)
+    return cache.incr(global_key) <= settings.TELEGRAM_GLOBAL_RATE_LIMIT
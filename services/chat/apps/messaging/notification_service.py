@@ -2,11 +2,31 @@
 """
 Централизованный сервис для отправки Telegram уведомлений.
 Обрабатывает все типы сообщений: текстовые, системные, карточки сделок.
+Вызывается воркером очереди (notification_queue.py), а не из обработки сообщения.
 """
 import os
-import requests
-from typing import Optional, Dict
-from .auth_client import AuthServiceClient
+from typing import Optional, Dict, List, Tuple
+from . import http_client, profile_cache
+
+
+def _plural(count: int, forms: Tuple[str, str, str]) -> str:
+    """'1 сообщение', '3 сообщения', '5 сообщений'"""
+    if count % 10 == 1 and count % 100 != 11:
+        form = forms[0]
+    elif 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        form = forms[1]
+    else:
+        form = forms[2]
+    return f"{count} {form}"
+
+
+class TelegramSendError(Exception):
+    """Ошибка Bot API: retry_after - пауза из ответа 429, permanent - повтор бесполезен"""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
 
 
 class TelegramNotificationService:
@@ -14,79 +34,55 @@ class TelegramNotificationService:
     
     def __init__(self):
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.auth_client = AuthServiceClient()
     
-    def send_notification(
-        self, 
-        message, 
-        sender_id: str, 
-        room_members: list
-    ) -> bool:
+    def build_notification(self, messages: List, receiver_id: str, digest: bool = False) -> Optional[Tuple[int, str]]:
         """
-        Отправить уведомление о новом сообщении
+        Подготовить одно уведомление о пачке сообщений для получателя
         
         Args:
-            message: объект Message из БД
-            sender_id: ID отправителя
-            room_members: список ID участников комнаты
+            messages: объекты Message в порядке создания
+            receiver_id: ID получателя
+            digest: сводка по всем комнатам вместо уведомления по одной комнате
         
         Returns:
-            bool: успешность отправки
+            (telegram_chat_id, текст) или None, если уведомление не нужно.
+            ProfileServiceUnavailable, если Auth Service недоступен.
         """
-        if not self.bot_token:
-            print("[TELEGRAM] ❌ Bot token не настроен")
-            return False
-        
-        # Находим получателя
-        receiver_id = self._get_receiver_id(sender_id, room_members)
-        if not receiver_id:
-            print("[TELEGRAM] ❌ Получатель не найден")
-            return False
+        sender_ids = {str(message.sender_id) for message in messages}
         
-        # Получаем данные получателя
-        receiver_data = self.auth_client.get_user_profile(receiver_id)
+        # Снимки профилей получателя и отправителей (кэш, промахи - одним запросом к Auth Service)
+        profiles = profile_cache.get_profiles([receiver_id, *sender_ids])
+        receiver_data = profiles.get(str(receiver_id))
         if not receiver_data:
             print(f"[TELEGRAM] ❌ Профиль получателя {receiver_id} не найден")
-            return False
+            return None
         
         # Проверяем настройки уведомлений
-        profile = receiver_data.get('profile', {})
-        telegram_chat_id = profile.get('telegram_chat_id')
-        telegram_enabled = profile.get('telegram_notifications_enabled', False)
+        telegram_chat_id = receiver_data['telegram_chat_id']
+        telegram_enabled = receiver_data['telegram_notifications_enabled']
         
         if not telegram_chat_id or not telegram_enabled:
             print(f"[TELEGRAM] ℹ️ Уведомления отключены для пользователя {receiver_id}")
-            return False
+            return None
         
-        # Получаем имя отправителя
-        sender_name = self._get_sender_name(sender_id)
+        if digest:
+            return telegram_chat_id, self._format_digest(messages, profiles)
         
-        # Формируем текст уведомления в зависимости от типа сообщения
-        notification_text = self._format_notification(message, sender_name)
+        last_message = messages[-1]
+        sender_name = self._get_sender_name(profiles.get(str(last_message.sender_id)))
         
-        # Отправляем через Telegram API
-        return self._send_to_telegram(telegram_chat_id, notification_text)
-    
-    def _get_receiver_id(self, sender_id: str, members: list) -> Optional[str]:
-        """Найти ID получателя (не отправителя)"""
-        for member_id in members:
-            if str(member_id) != str(sender_id):
-                return str(member_id)
-        return None
-    
-    def _get_sender_name(self, sender_id: str) -> str:
-        """Получить имя отправителя"""
-        sender_data = self.auth_client.get_user_profile(sender_id)
+        if len(messages) == 1:
+            # Формируем текст уведомления в зависимости от типа сообщения
+            return telegram_chat_id, self._format_notification(last_message, sender_name)
         
+        return telegram_chat_id, self._format_burst(messages, sender_name)
+    
+    def _get_sender_name(self, sender_data: Optional[Dict]) -> str:
+        """Получить имя отправителя из снимка его профиля"""
         if not sender_data:
             return "Пользователь"
         
-        sender_profile = sender_data.get('profile', {})
-        return (
-            sender_profile.get('full_name') or 
-            sender_profile.get('company_name') or 
-            sender_data.get('email', 'Пользователь')
-        )
+        return sender_data['display_name'] or 'Пользователь'
     
     def _format_notification(self, message, sender_name: str) -> str:
         """
@@ -109,13 +105,42 @@ class TelegramNotificationService:
         # Другие типы сообщений
         return f"🔔 <b>Уведомление от {sender_name}</b>\n\n{text[:100]}"
     
-    def _send_to_telegram(self, chat_id: int, text: str) -> bool:
-        """Отправить сообщение через Telegram Bot API"""
+    def _format_burst(self, messages: List, sender_name: str) -> str:
+        """Серия сообщений в одной комнате: количество и превью последнего"""
+        text = messages[-1].text or ''
+        text_preview = text.split('\n')[0][:100]
+        count = _plural(len(messages), ('новое сообщение', 'новых сообщения', 'новых сообщений'))
+        return f"💬 <b>{count} от {sender_name}</b>\n\n{text_preview}"
+    
+    def _format_digest(self, messages: List, profiles: Dict) -> str:
+        """Сводка: по строке на комнату, комнаты с последними сообщениями - выше"""
+        rooms = {}
+        for message in messages:
+            rooms.setdefault(message.room_id, []).append(message)
+        
+        lines = []
+        for room_messages in sorted(rooms.values(), key=lambda items: items[-1].created_at, reverse=True):
+            last_message = room_messages[-1]
+            sender_name = self._get_sender_name(profiles.get(str(last_message.sender_id)))
+            text_preview = (last_message.text or '').split('\n')[0][:60]
+            count = _plural(len(room_messages), ('сообщение', 'сообщения', 'сообщений'))
+            lines.append(f"• <b>{sender_name}</b> ({count}): {text_preview}")
+        
+        total = _plural(len(messages), ('новое сообщение', 'новых сообщения', 'новых сообщений'))
+        chats = _plural(len(rooms), ('чате', 'чатах', 'чатах'))
+        return f"📬 <b>Сводка: {total} в {chats}</b>\n\n" + '\n'.join(lines)
+    
+    def send_message(self, chat_id: int, text: str) -> None:
+        """Отправить сообщение через Telegram Bot API; при ошибке - TelegramSendError"""
+        if not self.bot_token:
+            raise TelegramSendError("Bot token не настроен", permanent=True)
+        
+        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        
         try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
-            
-            response = requests.post(
+            response = http_client.post(
                 url,
+                endpoint='telegram.sendMessage',
                 json={
                     'chat_id': chat_id,
                     'text': text,
@@ -123,14 +148,20 @@ class TelegramNotificationService:
                 },
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                print(f"[TELEGRAM] ✅ Уведомление отправлено в чат {chat_id}")
-                return True
-            else:
-                print(f"[TELEGRAM] ❌ Ошибка API: {response.status_code} - {response.text}")
-                return False
-                
         except Exception as e:
-            print(f"[TELEGRAM] ⚠️ Исключение при отправке: {e}")
-            return False
\ No newline at end of file
+            raise TelegramSendError(f"Исключение при отправке: {e}")
+        
+        if response.status_code == 200:
+            print(f"[TELEGRAM] ✅ Уведомление отправлено в чат {chat_id}")
+            return
+        
+        error = f"Ошибка API: {response.status_code} - {response.text[:200]}"
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after')
+            except ValueError:
+                retry_after = None
+            raise TelegramSendError(error, retry_after=retry_after)
+        
+        # 400/403 - чат не найден или бот заблокирован пользователем
+        raise TelegramSendError(error, permanent=400 <= response.status_code < 500)
@@ -0,0 +1,76 @@
+# services/chat/apps/messaging/profile_cache.py
+"""
+Кэш снимков профилей пользователей для уведомлений (Redis, TTL).
+
+В снимке только то, что нужно чату: отображаемое имя и настройки Telegram.
+Auth Service сбрасывает снимок при изменении профиля (internal-эндпоинт
+invalidate), TTL - страховка на случай потерянного события.
+"""
+from typing import Dict, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from .auth_client import AuthServiceClient
+
+KEY_PREFIX = 'profile'
+
+
+class ProfileServiceUnavailable(Exception):
+    """Auth Service не ответил - профили, которых нет в кэше, получить нельзя"""
+
+
+def _key(user_id) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def _snapshot(data: Dict) -> Dict:
+    profile = data.get('profile') or {}
+    return {
+        'id': data['id'],
+        'display_name': (
+            profile.get('full_name') or
+            profile.get('company_name') or
+            data.get('email') or
+            ''
+        ),
+        'telegram_chat_id': profile.get('telegram_chat_id'),
+        'telegram_notifications_enabled': bool(profile.get('telegram_notifications_enabled')),
+    }
+
+
+def get_profiles(user_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Снимки профилей {user_id: snapshot}. Промахи догружаются из Auth Service
+    одним batch-запросом; неизвестные пользователи кэшируются пустым снимком
+    и в результат не попадают. Если Auth Service недоступен -
+    ProfileServiceUnavailable.
+    """
+    user_ids = {str(user_id) for user_id in user_ids if user_id}
+    cached = cache.get_many([_key(user_id) for user_id in user_ids])
+
+    profiles = {}
+    missing = []
+    for user_id in user_ids:
+        snapshot = cached.get(_key(user_id))
+        if snapshot is None:
+            missing.append(user_id)
+        elif snapshot:
+            profiles[user_id] = snapshot
+
+    if missing:
+        fetched = AuthServiceClient().get_user_profiles(missing)
+        if fetched is None:
+            raise ProfileServiceUnavailable(f"Не удалось получить профили: {', '.join(missing)}")
+
+        to_cache = {}
+        for user_id in missing:
+            data = fetched.get(user_id)
+            to_cache[_key(user_id)] = _snapshot(data) if data else {}
+            if data:
+                profiles[user_id] = to_cache[_key(user_id)]
+        cache.set_many(to_cache, settings.PROFILE_CACHE_TIMEOUT)
+
+    return profiles
+
+
+def invalidate(user_ids: Iterable[str]) -> None:
+    cache.delete_many([_key(user_id) for user_id in user_ids])
@@ -1,5 +1,10 @@
+from datetime import datetime, timezone
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from .models import Room, Message, MessageAttachment, ReadReceipt
+from .models import Room, Message, MessageAttachment, ReadReceipt, NotificationPreference
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class MessageAttachmentSerializer(serializers.ModelSerializer):
@@ -33,7 +38,49 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'attachments']
 
 
+def with_room_summary(rooms, user_id):
+    """
+    Аннотировать комнаты id последнего сообщения и числом непрочитанных
+    сообщений user_id - коррелированными подзапросами в том же SQL-запросе
+    (по индексу (room, -created_at)), без запросов на каждую комнату.
+    """
+    last_message = Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id')
+    last_read_at = ReadReceipt.objects.filter(
+        room=OuterRef('pk'), user_id=user_id
+    ).values('last_read_message__created_at')[:1]
+    unread = (
+        Message.objects
+        .filter(room=OuterRef('pk'), created_at__gt=OuterRef('last_read_at'))
+        .exclude(sender_id=user_id)
+        .order_by()
+        .values('room')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return rooms.annotate(
+        last_message_id=Subquery(last_message.values('id')[:1]),
+        # Без отметки о прочтении непрочитанными считаются все чужие сообщения
+        last_read_at=Coalesce(Subquery(last_read_at), Value(EPOCH)),
+        unread_count=Coalesce(Subquery(unread), 0),
+    )
+
+
+def attach_last_messages(rooms):
+    """Загрузить последние сообщения аннотированных комнат одним запросом (с вложениями)"""
+    rooms = list(rooms)
+    message_ids = [room.last_message_id for room in rooms if room.last_message_id]
+    messages = Message.objects.filter(id__in=message_ids).prefetch_related('attachments')
+    by_id = {message.id: message for message in messages}
+    for room in rooms:
+        room.last_message = by_id.get(room.last_message_id)
+    return rooms
+
+
 class RoomSerializer(serializers.ModelSerializer):
+    """
+    Комнаты из with_room_summary + attach_last_messages сериализуются
+    без дополнительных запросов; остальные - запросами на комнату, как раньше.
+    """
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
 
@@ -43,13 +90,19 @@ class RoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
+        if hasattr(obj, 'last_message'):
+            last_msg = obj.last_message
+        else:
+            last_msg = obj.messages.last()
         if last_msg:
             return MessageSerializer(last_msg, context=self.context).data
         return None
     
     def get_unread_count(self, obj):
         """Получить количество непрочитанных сообщений для текущего пользователя"""
+        if hasattr(obj, 'unread_count'):
+            return obj.unread_count
+
         request = self.context.get('request')
         if not request or not hasattr(request, 'user'):
             return 0
@@ -78,3 +131,10 @@ class CreateRoomSerializer(serializers.Serializer):
         child=serializers.UUIDField(),
         min_length=2
     )
+
+
+class NotificationPreferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NotificationPreference
+        fields = ['mode', 'digest_interval_minutes', 'updated_at']
+        read_only_fields = ['updated_at']
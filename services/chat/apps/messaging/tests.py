@@ -1,3 +1,269 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from unittest import SkipTest, mock
 
-# Create your tests here.
+import redis
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import notification_queue, unread_counters
+from .jwt_service import ServiceJWT
+from .models import Message, Room, TelegramNotification
+from .notification_service import TelegramSendError
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@mock.patch('apps.messaging.views.broadcast')
+@mock.patch('apps.messaging.views.unread_counters')
+@mock.patch('apps.messaging.views.notification_queue')
+class SendDealMessageAuthTests(TestCase):
+    """send_deal_message принимает только токены внутренних сервисов"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sender_id = str(uuid.uuid4())
+        self.room = Room.objects.create(members=[self.sender_id, str(uuid.uuid4())])
+        self.url = f'/api/chat/rooms/{self.room.id}/send_deal_message/'
+        self.payload = {
+            'sender_id': self.sender_id,
+            'message_type': 'deal_card',
+            'text': '📋 Создан заказ: Лендинг',
+            'deal_data': {'deal_id': str(uuid.uuid4())},
+        }
+
+    def test_service_token_is_accepted(self, *mocks):
+        token = ServiceJWT.get_service_token('market-service', expires_minutes=5)
+        response = self.client.post(
+            self.url, self.payload, format='json', HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        message = Message.objects.get(room=self.room)
+        self.assertEqual(str(message.sender_id), self.sender_id)
+        self.assertEqual(message.message_type, 'deal_card')
+
+    def test_user_token_is_rejected(self, *mocks):
+        token = AccessToken()
+        token['user_id'] = self.sender_id
+        token['email'] = 'client@example.com'
+        token['role'] = 'client'
+
+        response = self.client.post(
+            self.url, self.payload, format='json', HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Message.objects.filter(room=self.room).exists())
+
+    def test_missing_token_is_rejected(self, *mocks):
+        response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+
+class UnreadCountersTests(TestCase):
+    """Счетчики в Redis: заполнение из БД до HINCRBY и TTL при каждой записи"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            unread_counters.get_client().ping()
+        except redis.RedisError:
+            cls.tearDownClass()
+            raise SkipTest('Redis недоступен')
+
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        self.room_id = str(uuid.uuid4())
+        self.key = unread_counters._key(self.user_id)
+        self.addCleanup(unread_counters.get_client().delete, self.key)
+
+    def _from_db(self, count):
+        return mock.patch.object(unread_counters, '_count_from_db', return_value={self.room_id: count})
+
+    def test_increment_seeds_unseeded_hash_from_db(self):
+        # В БД уже есть новое сообщение и два старых непрочитанных
+        with self._from_db(3):
+            unread = unread_counters.increment(self.room_id, [self.user_id])
+
+        self.assertEqual(unread, {self.user_id: 3})
+        stored = unread_counters.get_client().hgetall(self.key)
+        self.assertEqual(stored[self.room_id], '3')
+        self.assertIn(unread_counters.SEEDED_FIELD, stored)
+        self.assertGreater(unread_counters.get_client().ttl(self.key), 0)
+
+    def test_increment_on_seeded_hash_adds_one(self):
+        with self._from_db(2) as count_from_db:
+            unread_counters.get_all(self.user_id)
+            unread = unread_counters.increment(self.room_id, [self.user_id])
+
+        self.assertEqual(unread, {self.user_id: 3})
+        self.assertEqual(count_from_db.call_count, 1)
+
+    def test_reset_returns_previous_and_zeroes_counter(self):
+        mark_read = mock.Mock()
+        with self._from_db(4):
+            unread_counters.get_all(self.user_id)
+
+        previous = unread_counters.reset(self.room_id, self.user_id, mark_read)
+
+        self.assertEqual(previous, 4)
+        mark_read.assert_called_once_with()
+        self.assertEqual(unread_counters.get_client().hget(self.key, self.room_id), '0')
+        self.assertGreater(unread_counters.get_client().ttl(self.key), 0)
+
+    def test_reset_of_expired_hash_sets_ttl(self):
+        previous = unread_counters.reset(self.room_id, self.user_id, mock.Mock())
+
+        self.assertIsNone(previous)
+        self.assertGreater(unread_counters.get_client().ttl(self.key), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@mock.patch('apps.messaging.notification_queue.TelegramNotificationService')
+class NotificationQueueLeaseTests(TestCase):
+    """Воркер забирает уведомления арендой, а не транзакцией на всю пачку"""
+
+    def setUp(self):
+        self.sender_id = str(uuid.uuid4())
+        self.receiver_id = str(uuid.uuid4())
+        self.room = Room.objects.create(members=[self.sender_id, self.receiver_id])
+        message = Message.objects.create(room=self.room, sender_id=self.sender_id, text='Привет')
+        self.notification = TelegramNotification.objects.create(
+            message=message, room=self.room, receiver_id=self.receiver_id,
+            next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+
+    def _service(self, service_class):
+        service = service_class.return_value
+        service.build_notification.return_value = (42, 'Новое сообщение')
+        return service
+
+    def test_claimed_rows_are_leased_and_not_claimed_twice(self, service_class):
+        groups = notification_queue._claim(batch_size=10)
+
+        self.notification.refresh_from_db()
+        self.assertEqual([[item.id for item in group] for group in groups], [[self.notification.id]])
+        self.assertEqual(self.notification.status, 'sending')
+        self.assertGreater(self.notification.claimed_until, timezone.now())
+        self.assertEqual(notification_queue._claim(batch_size=10), [])
+
+    def test_expired_lease_returns_to_queue(self, service_class):
+        service = self._service(service_class)
+        TelegramNotification.objects.filter(id=self.notification.id).update(
+            status='sending', claimed_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        stats = notification_queue.process_due()
+
+        self.assertEqual(stats['sent'], 1)
+        service.send_message.assert_called_once_with(42, 'Новое сообщение')
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, 'sent')
+        self.assertIsNone(self.notification.claimed_until)
+
+    def test_active_lease_is_skipped(self, service_class):
+        service = self._service(service_class)
+        TelegramNotification.objects.filter(id=self.notification.id).update(
+            status='sending', claimed_until=timezone.now() + timedelta(minutes=5)
+        )
+
+        stats = notification_queue.process_due()
+
+        self.assertEqual(sum(stats.values()), 0)
+        service.send_message.assert_not_called()
+
+    def test_failure_releases_lease_for_retry(self, service_class):
+        service = self._service(service_class)
+        service.send_message.side_effect = TelegramSendError('Bad Gateway')
+
+        stats = notification_queue.process_due()
+
+        self.assertEqual(stats['retried'], 1)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.status, 'pending')
+        self.assertIsNone(self.notification.claimed_until)
+        self.assertEqual(self.notification.attempts, 1)
+        self.assertGreater(self.notification.next_attempt_at, timezone.now())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, TELEGRAM_COALESCE_SECONDS=15)
+@mock.patch('apps.messaging.notification_queue.TelegramNotificationService')
+class NotificationCoalescingTests(TestCase):
+    """Серия сообщений в комнате уходит получателю одним уведомлением"""
+
+    def setUp(self):
+        self.sender_id = str(uuid.uuid4())
+        self.receiver_id = str(uuid.uuid4())
+        self.room = Room.objects.create(members=[self.sender_id, self.receiver_id])
+
+    def _notify(self, room=None, text='Привет'):
+        room = room or self.room
+        message = Message.objects.create(room=room, sender_id=self.sender_id, text=text)
+        return TelegramNotification.objects.create(
+            message=message, room=room, receiver_id=self.receiver_id,
+            next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+
+    def _service(self, service_class):
+        service = service_class.return_value
+        service.build_notification.return_value = (42, '3 новых сообщения')
+        return service
+
+    @mock.patch.dict('os.environ', {'TELEGRAM_BOT_TOKEN': 'test-token'})
+    def test_enqueue_waits_for_coalesce_window(self, service_class):
+        message = Message.objects.create(room=self.room, sender_id=self.sender_id, text='Привет')
+
+        created = notification_queue.enqueue(message, [self.sender_id, self.receiver_id])
+
+        self.assertEqual(created, 1)
+        notification = TelegramNotification.objects.get(message=message)
+        self.assertEqual(str(notification.receiver_id), self.receiver_id)
+        self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=10))
+
+    def test_burst_in_room_is_sent_once(self, service_class):
+        service = self._service(service_class)
+        notifications = [self._notify(text=f'Сообщение {index}') for index in range(3)]
+
+        stats = notification_queue.process_due()
+
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['coalesced'], 2)
+        service.send_message.assert_called_once_with(42, '3 новых сообщения')
+        messages = service.build_notification.call_args.args[0]
+        self.assertEqual([message.text for message in messages], ['Сообщение 0', 'Сообщение 1', 'Сообщение 2'])
+        statuses = [
+            TelegramNotification.objects.get(id=notification.id).status for notification in notifications
+        ]
+        self.assertEqual(statuses, ['sent', 'coalesced', 'coalesced'])
+
+    def test_rooms_are_not_mixed(self, service_class):
+        service = self._service(service_class)
+        other_room = Room.objects.create(members=[self.sender_id, self.receiver_id])
+        self._notify()
+        self._notify(room=other_room)
+
+        stats = notification_queue.process_due()
+
+        # Две группы; вторая упирается в лимит чата и откладывается на секунду
+        self.assertEqual(stats['sent'] + stats['deferred'], 2)
+        self.assertEqual(
+            [len(call.args[0]) for call in service.build_notification.call_args_list], [1, 1]
+        )
+
+    def test_group_is_retried_as_a_whole(self, service_class):
+        service = self._service(service_class)
+        service.send_message.side_effect = TelegramSendError('Too Many Requests', retry_after=30)
+        notifications = [self._notify() for _ in range(2)]
+
+        stats = notification_queue.process_due()
+
+        self.assertEqual(stats['retried'], 1)
+        for notification in notifications:
+            notification.refresh_from_db()
+            self.assertEqual(notification.status, 'pending')
+            self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=20))
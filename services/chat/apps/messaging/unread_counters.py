@@ -0,0 +1,161 @@
+# services/chat/apps/messaging/unread_counters.py
+"""
+Счетчики непрочитанных сообщений в Redis.
+
+У каждого пользователя hash chat:unread:<user_id> с полями room_id -> число.
+Сохранение сообщения увеличивает счетчики получателей (HINCRBY), mark_read
+обнуляет счетчик комнаты; изменения уходят в личную группу пользователя
+дельтами. Все счетчики пользователя читаются одним HGETALL.
+
+Источник истины - ReadReceipt в БД: hash без поля _seeded (новый
+пользователь, истекший TTL) заполняется из БД при первом чтении или
+первом новом сообщении - HINCRBY по пустому hash дал бы неверное число.
+Каждая запись в hash продлевает его TTL.
+Ошибки Redis не мешают отправке сообщений - счетчики лишь восстановятся
+при следующем заполнении.
+
+Заполнение и сброс идут под WATCH hash пользователя: если между чтением
+БД (или записью ReadReceipt) и записью в Redis пришел HINCRBY, попытка
+повторяется, а после MAX_WATCH_ATTEMPTS hash помечается незаполненным
+и пересчитывается из БД при следующем чтении.
+"""
+from typing import Callable, Dict, Iterable, Optional
+
+import redis
+from django.conf import settings
+
+from . import membership
+from .serializers import with_room_summary
+
+KEY_PREFIX = 'chat:unread'
+SEEDED_FIELD = '_seeded'
+MAX_WATCH_ATTEMPTS = 3
+
+_client = None
+
+
+def get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=settings.UNREAD_COUNTERS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.UNREAD_COUNTERS_SOCKET_TIMEOUT,
+        )
+    return _client
+
+
+def _key(user_id) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def increment(room_id, user_ids: Iterable) -> Dict[str, int]:
+    """Увеличить счетчик комнаты получателям сообщения; {user_id: новое значение}"""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+
+    pipe = get_client().pipeline(transaction=True)
+    for user_id in user_ids:
+        pipe.hincrby(_key(user_id), str(room_id), 1)
+        pipe.hexists(_key(user_id), SEEDED_FIELD)
+        pipe.expire(_key(user_id), settings.UNREAD_COUNTERS_TTL)
+    try:
+        results = pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Не удалось обновить счетчики непрочитанных комнаты {room_id}: {e}")
+        return {}
+
+    unread = {}
+    for index, user_id in enumerate(user_ids):
+        count, seeded = results[index * 3], results[index * 3 + 1]
+        if not seeded:
+            # HINCRBY учел только это сообщение - заполняем hash из БД (сообщение уже в ней)
+            try:
+                count = _seed(user_id).get(str(room_id), 0)
+            except redis.RedisError as e:
+                print(f"⚠️ Не удалось заполнить счетчики непрочитанных пользователя {user_id}: {e}")
+                continue
+        unread[user_id] = count
+    return unread
+
+
+def reset(room_id, user_id, mark_read: Callable[[], None]) -> Optional[int]:
+    """
+    Записать отметку о прочтении (mark_read) и обнулить счетчик комнаты так,
+    чтобы сообщение, пришедшее между ними, не потерялось: при HINCRBY после
+    WATCH отметка пишется заново. Возвращает прежнее значение счетчика
+    (None, если его не было или Redis недоступен).
+    """
+    key, field = _key(user_id), str(room_id)
+    marked = False
+    try:
+        with get_client().pipeline(transaction=True) as pipe:
+            for _ in range(MAX_WATCH_ATTEMPTS):
+                try:
+                    pipe.watch(key)
+                    previous = pipe.hget(key, field)
+                    mark_read()
+                    marked = True
+                    pipe.multi()
+                    pipe.hset(key, field, 0)
+                    pipe.expire(key, settings.UNREAD_COUNTERS_TTL)
+                    pipe.execute()
+                    return int(previous) if previous is not None else None
+                except redis.WatchError:
+                    continue
+            # Отметка записана, но счетчик так и не удалось сбросить атомарно
+            get_client().hdel(key, SEEDED_FIELD)
+    except redis.RedisError as e:
+        print(f"⚠️ Не удалось сбросить счетчик непрочитанных комнаты {room_id}: {e}")
+        if not marked:
+            mark_read()
+    return None
+
+
+def get_all(user_id) -> Dict[str, int]:
+    """Ненулевые счетчики пользователя {room_id: число} одним запросом к Redis"""
+    try:
+        counters = get_client().hgetall(_key(user_id))
+        if SEEDED_FIELD not in counters:
+            counters = _seed(user_id)
+    except redis.RedisError as e:
+        print(f"⚠️ Redis недоступен, счетчики непрочитанных считаются по БД: {e}")
+        counters = _count_from_db(user_id)
+
+    return {
+        room_id: int(count)
+        for room_id, count in counters.items()
+        if room_id != SEEDED_FIELD and int(count) > 0
+    }
+
+
+def _count_from_db(user_id) -> Dict[str, int]:
+    """Счетчики по ReadReceipt (один запрос по всем комнатам)"""
+    return {
+        str(room_id): unread_count
+        for room_id, unread_count in with_room_summary(
+            membership.rooms_of(user_id), str(user_id)
+        ).values_list('id', 'unread_count')
+    }
+
+
+def _seed(user_id) -> Dict[str, int]:
+    """Заполнить hash счетчиков пользователя из БД (если за это время не пришел HINCRBY)"""
+    key = _key(user_id)
+    with get_client().pipeline(transaction=True) as pipe:
+        for _ in range(MAX_WATCH_ATTEMPTS):
+            try:
+                pipe.watch(key)
+                counters = _count_from_db(user_id)
+                pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping={**counters, SEEDED_FIELD: 1})
+                pipe.expire(key, settings.UNREAD_COUNTERS_TTL)
+                pipe.execute()
+                return counters
+            except redis.WatchError:
+                continue
+    # Hash остается незаполненным - следующее чтение попробует снова
+    return counters
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RoomViewSet
+from .views import RoomViewSet, NotificationPreferenceView, InternalProfileInvalidateView
 
 router = DefaultRouter()
 router.register('rooms', RoomViewSet, basename='room')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('notification-settings/', NotificationPreferenceView.as_view(), name='notification-settings'),
+    path('internal/profiles/invalidate/', InternalProfileInvalidateView.as_view(), name='internal-profiles-invalidate'),
 ]
@@ -2,22 +2,33 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from .models import Room, Message, MessageAttachment, ReadReceipt
-from .serializers import RoomSerializer, MessageSerializer, MessageAttachmentSerializer
-from .notification_service import TelegramNotificationService
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .models import Room, Message, MessageAttachment, ReadReceipt, NotificationPreference, TelegramNotification
+from .serializers import (
+    RoomSerializer, MessageSerializer, MessageAttachmentSerializer, NotificationPreferenceSerializer,
+    with_room_summary, attach_last_messages,
+)
+from . import broadcast, membership, message_payload, notification_queue, profile_cache, unread_counters
+from .authentication import ServiceJWTAuthentication
 from django.core.files.uploadedfile import UploadedFile
 from django.core.files.base import File
+from django.core.exceptions import ValidationError
 from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import os
 import uuid
 import magic
 from rest_framework.throttling import UserRateThrottle
 
 
+DEFAULT_MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+MESSAGE_CURSOR_PARAMS = ('limit', 'before', 'after', 'since')
+
+
 class RoomCreationThrottle(UserRateThrottle):
     scope = 'room_creation'
 
@@ -29,6 +40,20 @@ class RoomViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
+    def _membership_error(self, room_id, user_id):
+        """
+        Проверка доступа к комнате через кэш членства (без загрузки Room).
+        None - доступ есть; иначе ответ 403 или 404.
+        """
+        try:
+            if membership.is_member(room_id, user_id):
+                return None
+            if Room.objects.filter(id=room_id).exists():
+                return Response({'error': 'Нет доступа'}, status=403)
+        except ValidationError:
+            pass
+        return Response({'error': 'Комната не найдена'}, status=404)
+
     def _validate_file(self, file, max_size_mb=20):
         """Валидация файла с MIME-type проверкой"""
         if file.size > max_size_mb * 1024 * 1024:
@@ -84,11 +109,11 @@ class RoomViewSet(viewsets.ViewSet):
     def list(self, request):
         """Получить все комнаты пользователя с правильной сортировкой"""
         user_id = str(request.user.id)
-        rooms = Room.objects.filter(
-            members__contains=[user_id]
+        rooms = with_room_summary(
+            membership.rooms_of(user_id), user_id
         ).order_by('-updated_at')  # Сортировка по времени последнего сообщения
         
-        serializer = RoomSerializer(rooms, many=True, context={'request': request})
+        serializer = RoomSerializer(attach_last_messages(rooms), many=True, context={'request': request})
         
         return Response({
             'status': 'success',
@@ -99,13 +124,13 @@ class RoomViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """Получить конкретную комнату"""
         try:
-            room = Room.objects.get(id=pk)
             user_id = str(request.user.id)
-            
-            if user_id not in room.members:
-                return Response({'error': 'Нет доступа'}, status=403)
-            
-            serializer = RoomSerializer(room, context={'request': request})
+            error = self._membership_error(pk, user_id)
+            if error:
+                return error
+
+            room = with_room_summary(Room.objects.all(), user_id).get(id=pk)
+            serializer = RoomSerializer(attach_last_messages([room])[0], context={'request': request})
             return Response({
                 'status': 'success',
                 'data': serializer.data,
@@ -123,23 +148,34 @@ class RoomViewSet(viewsets.ViewSet):
         if not user2_id:
             return Response({'error': 'user2_id обязателен'}, status=400)
 
-        existing_room = Room.objects.filter(
-            members__contains=[user1_id]
-        ).filter(
-            members__contains=[user2_id]
+        try:
+            # Канонический вид id для ключа пары
+            user1_id, user2_id = str(uuid.UUID(user1_id)), str(uuid.UUID(str(user2_id)))
+        except ValueError:
+            return Response({'error': 'Некорректный user2_id'}, status=400)
+
+        existing_room = with_room_summary(Room.objects.all(), user1_id).filter(
+            pair_key=Room.make_pair_key(user1_id, user2_id)
         ).first()
 
         if existing_room:
-            serializer = RoomSerializer(existing_room, context={'request': request})
+            serializer = RoomSerializer(attach_last_messages([existing_room])[0], context={'request': request})
             return Response({
                 'status': 'success',
                 'data': serializer.data,
                 'message': 'Комната уже существует'
             })
 
-        room = Room.objects.create(members=[user1_id, user2_id])
+        room, created = membership.create_pair_room(user1_id, user2_id)
         serializer = RoomSerializer(room, context={'request': request})
 
+        if not created:
+            return Response({
+                'status': 'success',
+                'data': serializer.data,
+                'message': 'Комната уже существует'
+            })
+
         return Response({
             'status': 'success',
             'data': serializer.data,
@@ -150,45 +186,141 @@ class RoomViewSet(viewsets.ViewSet):
     def messages(self, request, pk=None):
         """Получить историю сообщений комнаты"""
         try:
-            room = Room.objects.get(id=pk)
-            user_id = str(request.user.id)
-            
-            if user_id not in room.members:
-                return Response({'error': 'Нет доступа'}, status=403)
-            
-            messages = room.messages.all().order_by('created_at')
-            serializer = MessageSerializer(messages, many=True, context={'request': request})
-            
+            error = self._membership_error(pk, str(request.user.id))
+            if error:
+                return error
+
+            messages = Message.objects.filter(room_id=pk).prefetch_related('attachments')
+            kind = request.query_params.get('kind')
+            if kind == 'text':
+                messages = messages.filter(message_type='text')
+            elif kind == 'deal':
+                messages = messages.exclude(message_type='text')
+
+            if not any(param in request.query_params for param in MESSAGE_CURSOR_PARAMS):
+                # Без параметров пагинации - вся история, как раньше
+                serializer = MessageSerializer(messages.order_by('created_at'), many=True, context={'request': request})
+                return Response({
+                    'status': 'success',
+                    'data': serializer.data,
+                    'error': None
+                })
+
+            try:
+                page, has_more = self._paginate_messages(pk, messages, request.query_params)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+
+            serializer = MessageSerializer(page, many=True, context={'request': request})
             return Response({
                 'status': 'success',
                 'data': serializer.data,
+                'pagination': {
+                    'has_more': has_more,
+                    'before': str(page[0].id) if page else None,
+                    'after': str(page[-1].id) if page else None,
+                },
                 'error': None
             })
         except Room.DoesNotExist:
             return Response({'error': 'Комната не найдена'}, status=404)
 
+    def _paginate_messages(self, room_id, messages, params):
+        """
+        Страница истории по курсору, сообщения в хронологическом порядке.
+        before=<id> - более старые сообщения (без курсора - последние),
+        after=<id> - более новые, since=<ISO-время> - созданные или измененные
+        (карточки заказов) после этого времени, для переподключения.
+        Курсор (created_at, id) идет по индексу (room, -created_at), since - по (room, updated_at).
+        has_more - есть ли еще сообщения в направлении выборки.
+        """
+        try:
+            limit = min(int(params.get('limit', DEFAULT_MESSAGE_PAGE_SIZE)), MAX_MESSAGE_PAGE_SIZE)
+        except ValueError:
+            raise ValueError('limit должен быть числом')
+        if limit < 1:
+            raise ValueError('limit должен быть положительным')
+
+        before, after, since = params.get('before'), params.get('after'), params.get('since')
+        if sum(bool(value) for value in (before, after, since)) > 1:
+            raise ValueError('Укажите только один из параметров before, after, since')
+
+        if after or since:
+            if after:
+                cursor = self._get_cursor(room_id, after)
+                messages = messages.filter(
+                    Q(created_at__gt=cursor.created_at) |
+                    Q(created_at=cursor.created_at, id__gt=cursor.id)
+                )
+            else:
+                since_dt = parse_datetime(since)
+                if since_dt is None:
+                    raise ValueError('since должен быть временем в формате ISO 8601')
+                if timezone.is_naive(since_dt):
+                    since_dt = timezone.make_aware(since_dt)
+                messages = messages.filter(updated_at__gt=since_dt)
+
+            page = list(messages.order_by('created_at', 'id')[:limit + 1])
+            return page[:limit], len(page) > limit
+
+        if before:
+            cursor = self._get_cursor(room_id, before)
+            messages = messages.filter(
+                Q(created_at__lt=cursor.created_at) |
+                Q(created_at=cursor.created_at, id__lt=cursor.id)
+            )
+
+        page = list(messages.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        return page[:limit][::-1], has_more
+
+    def _get_cursor(self, room_id, message_id):
+        """Сообщение-курсор этой комнаты (любого типа)"""
+        try:
+            return Message.objects.only('id', 'created_at').get(id=message_id, room_id=room_id)
+        except (Message.DoesNotExist, ValidationError):
+            raise ValueError('Некорректный курсор')
+
+    @action(detail=False, methods=['get'], url_path='unread')
+    def unread(self, request):
+        """Счетчики непрочитанных сообщений по всем комнатам пользователя"""
+        counters = unread_counters.get_all(str(request.user.id))
+        return Response({
+            'status': 'success',
+            'data': {
+                'counters': counters,
+                'total': sum(counters.values()),
+            },
+            'error': None
+        })
+
     @action(detail=True, methods=['post'], url_path='mark-read')
     def mark_read(self, request, pk=None):
         """Отметить все сообщения как прочитанные"""
         try:
-            room = Room.objects.get(id=pk)
             user_id = str(request.user.id)
+            error = self._membership_error(pk, user_id)
+            if error:
+                return error
             
-            if user_id not in room.members:
-                return Response({'error': 'Нет доступа'}, status=403)
-            
-            # Получаем последнее сообщение в комнате
-            last_message = room.messages.last()
-            
-            if last_message:
-                # Обновляем или создаем запись о прочтении
-                ReadReceipt.objects.update_or_create(
-                    room=room,
-                    user_id=user_id,
-                    defaults={
-                        'last_read_message': last_message
-                    }
-                )
+            def write_receipt():
+                # Получаем последнее сообщение в комнате
+                last_message = Message.objects.filter(room_id=pk).last()
+
+                if last_message:
+                    # Обновляем или создаем запись о прочтении
+                    ReadReceipt.objects.update_or_create(
+                        room_id=pk,
+                        user_id=user_id,
+                        defaults={
+                            'last_read_message': last_message
+                        }
+                    )
+
+            # Отметка и сброс счетчика атомарны относительно новых сообщений
+            previous = unread_counters.reset(pk, user_id, write_receipt)
+            if previous:
+                broadcast.send_unread_sync(pk, {user_id: 0}, delta=-previous)
             
             return Response({
                 'status': 'success',
@@ -198,9 +330,12 @@ class RoomViewSet(viewsets.ViewSet):
         except Room.DoesNotExist:
             return Response({'error': 'Комната не найдена'}, status=404)
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], authentication_classes=[ServiceJWTAuthentication])
     def send_deal_message(self, request, pk=None):
-        """Отправить или обновить интерактивное сообщение о сделке в комнату"""
+        """
+        Отправить или обновить интерактивное сообщение о сделке в комнату.
+        Только для внутренних сервисов (токен ServiceJWT); автор - sender_id из запроса.
+        """
         try:
             room = Room.objects.get(id=pk)
             
@@ -213,27 +348,20 @@ class RoomViewSet(viewsets.ViewSet):
             
             if update_message_id:
                 try:
-                    message = Message.objects.get(id=update_message_id, room=room)
+                    message = Message.objects.prefetch_related('attachments').get(id=update_message_id, room=room)
                     
                     message.text = text
                     message.message_type = message_type
                     message.deal_data = deal_data
                     message.save()
                     
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        f'chat_{pk}',
-                        {
-                            'type': 'message_updated',
-                            'message': self._serialize_message(message, request)
-                        }
+                    serialized = message_payload.serialize_message(message)
+                    broadcast.send_frame_sync(
+                        pk, room.members, 'message_updated',
+                        message_payload.frame('message_updated', serialized)
                     )
                     
-                    return Response({
-                        'status': 'success',
-                        'data': MessageSerializer(message, context={'request': request}).data,
-                        'message': 'Сообщение обновлено'
-                    })
+                    return message_payload.success_response(serialized, 'Сообщение обновлено')
                     
                 except Message.DoesNotExist:
                     pass
@@ -246,56 +374,37 @@ class RoomViewSet(viewsets.ViewSet):
                 deal_data=deal_data
             )
             
-            if attachments_data:
-                for att_data in attachments_data:
-                    MessageAttachment.objects.create(
-                        message=message,
-                        filename=att_data.get('filename', 'file'),
-                        file_size=att_data.get('file_size', 0),
-                        content_type=att_data.get('content_type', 'application/octet-stream'),
-                        external_url=att_data.get('url', ''),
-                        display_mode='attachment'
-                    )
+            attachments = MessageAttachment.objects.bulk_create([
+                MessageAttachment(
+                    message=message,
+                    filename=att_data.get('filename', 'file'),
+                    file_size=att_data.get('file_size', 0),
+                    content_type=att_data.get('content_type', 'application/octet-stream'),
+                    external_url=att_data.get('url', ''),
+                    display_mode='attachment'
+                )
+                for att_data in attachments_data
+            ])
             
-            # ✅ ОТПРАВКА TELEGRAM УВЕДОМЛЕНИЯ О СИСТЕМНОМ СООБЩЕНИИ
-            self._send_system_message_notification(message, sender_id, room.members)
+            # Telegram-уведомление о системном сообщении отправит воркер очереди
+            notification_queue.enqueue(message, room.members)
+            unread = unread_counters.increment(
+                pk, {str(member_id) for member_id in room.members} - {str(sender_id)}
+            )
             
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'chat_{pk}',
-                {
-                    'type': 'chat_message',
-                    'message': self._serialize_message(message, request)
-                }
+            serialized = message_payload.serialize_message(message, attachments)
+            broadcast.send_frame_sync(
+                pk, room.members, 'chat_message', message_payload.frame('message', serialized)
             )
+            broadcast.send_unread_sync(pk, unread, delta=1)
             
-            return Response({
-                'status': 'success',
-                'data': MessageSerializer(message, context={'request': request}).data,
-                'message': 'Сообщение отправлено'
-            })
+            return message_payload.success_response(serialized, 'Сообщение отправлено')
             
         except Room.DoesNotExist:
             return Response({'error': 'Комната не найдена'}, status=404)
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
-    def _send_system_message_notification(self, message, sender_id, members):
-        """
-        Отправить Telegram уведомление о системном сообщении
-        """
-        try:
-            notification_service = TelegramNotificationService()
-            success = notification_service.send_notification(message, sender_id, members)
-            
-            if success:
-                print(f"[TELEGRAM] ✅ Системное уведомление отправлено")
-            else:
-                print(f"[TELEGRAM] ℹ️ Системное уведомление не отправлено")
-                
-        except Exception as e:
-            print(f"[TELEGRAM] ⚠️ Ошибка отправки системного уведомления: {e}")
-
     @action(detail=False, methods=['post'], url_path='upload', throttle_classes=[FileUploadThrottle])
     def upload_files(self, request):
         """Для изображений со сжатием (display_mode = 'inline')"""
@@ -416,35 +525,46 @@ class RoomViewSet(viewsets.ViewSet):
                 'error': str(e)
             }, status=400)
 
-    def _serialize_message(self, message, request):
-        """Сериализация сообщения для WebSocket"""
-        attachments = []
-        for att in message.attachments.all():
-            file_url = att.get_file_url()
-            if not file_url:
-                continue
-                
-            if not file_url.startswith('http'):
-                file_url = request.build_absolute_uri(file_url)
-                
-            attachments.append({
-                'id': str(att.id),
-                'name': att.filename,
-                'filename': att.filename,
-                'size': att.file_size,
-                'file_size': att.file_size,
-                'content_type': att.content_type,
-                'url': file_url,
-                'display_mode': att.display_mode
-            })
-        
-        return {
-            'id': str(message.id),
-            'room_id': str(message.room_id),
-            'sender_id': str(message.sender_id),
-            'text': message.text,
-            'message_type': message.message_type,
-            'deal_data': message.deal_data,
-            'attachments': attachments,
-            'created_at': message.created_at.isoformat(),
-        }
+
+class NotificationPreferenceView(APIView):
+    """Настройки Telegram-уведомлений текущего пользователя (сразу или сводкой)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        preference = (
+            NotificationPreference.objects.filter(user_id=request.user.id).first()
+            or NotificationPreference(user_id=request.user.id)
+        )
+        return Response({'status': 'success', 'data': NotificationPreferenceSerializer(preference).data})
+
+    def patch(self, request):
+        preference, _ = NotificationPreference.objects.get_or_create(user_id=request.user.id)
+        serializer = NotificationPreferenceSerializer(preference, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=400)
+
+        preference = serializer.save()
+        if preference.mode == 'instant':
+            # Накопленная сводка уходит сразу, уведомлениями по комнатам
+            TelegramNotification.objects.filter(
+                receiver_id=request.user.id, status='pending', digest=True
+            ).update(digest=False, next_attempt_at=timezone.now())
+
+        return Response({'status': 'success', 'data': NotificationPreferenceSerializer(preference).data})
+
+
+class InternalProfileInvalidateView(APIView):
+    """
+    Сброс снимков профилей в кэше (вызывает Auth Service при изменении профиля).
+    Защищен InternalServiceMiddleware.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        user_ids = request.data.get('user_ids', [])
+        if not isinstance(user_ids, list):
+            return Response({'status': 'error', 'error': 'user_ids must be a list'}, status=400)
+
+        profile_cache.invalidate([str(user_id) for user_id in user_ids])
+        return Response({'status': 'success', 'data': {'invalidated': len(user_ids)}})
@@ -28,6 +28,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.messaging.middleware.InternalServiceMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -60,15 +61,37 @@ DATABASES = {
     }
 }
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [os.getenv('REDIS_URL', 'redis://localhost:6379/0')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'chat',
+    }
+}
+
+# Время жизни снимков профилей (сек); Auth Service сбрасывает их при изменении профиля
+PROFILE_CACHE_TIMEOUT = int(os.getenv('PROFILE_CACHE_TIMEOUT', '3600'))
+
+# Кэш проверок членства в комнатах: Redis и память процесса (сек)
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv('MEMBERSHIP_CACHE_TIMEOUT', '3600'))
+MEMBERSHIP_LOCAL_CACHE_SECONDS = int(os.getenv('MEMBERSHIP_LOCAL_CACHE_SECONDS', '30'))
+
+# Счетчики непрочитанных в Redis заполняются из БД заново, если не менялись дольше (сек)
+UNREAD_COUNTERS_TTL = int(os.getenv('UNREAD_COUNTERS_TTL', str(7 * 24 * 3600)))
+# Таймаут подключения и операций Redis для счетчиков (сек): при зависшем Redis отправка сообщений не ждет
+UNREAD_COUNTERS_SOCKET_TIMEOUT = float(os.getenv('UNREAD_COUNTERS_SOCKET_TIMEOUT', '0.5'))
+
 SIMPLE_JWT = {
     'SIGNING_KEY': os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production'),
     'ALGORITHM': 'HS256',
@@ -100,6 +123,8 @@ REST_FRAMEWORK = {
 # Настройки медиа-файлов
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Публичный адрес сервиса для ссылок на вложения в WebSocket-сообщениях и ответах
+CHAT_PUBLIC_MEDIA_URL = os.getenv('CHAT_PUBLIC_MEDIA_URL', 'http://localhost:8003')
 
 # Настройки загрузки файлов
 FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
@@ -117,3 +142,19 @@ USE_I18N = True
 USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Межсервисные HTTP-запросы (пул соединений, см. http_client.py)
+INTERNAL_HTTP_CONNECT_TIMEOUT = float(os.getenv('INTERNAL_HTTP_CONNECT_TIMEOUT', '2'))
+INTERNAL_HTTP_READ_TIMEOUT = float(os.getenv('INTERNAL_HTTP_READ_TIMEOUT', '5'))
+INTERNAL_HTTP_RETRIES = int(os.getenv('INTERNAL_HTTP_RETRIES', '2'))
+INTERNAL_HTTP_POOL_SIZE = int(os.getenv('INTERNAL_HTTP_POOL_SIZE', '10'))
+INTERNAL_HTTP_METRICS_INTERVAL = int(os.getenv('INTERNAL_HTTP_METRICS_INTERVAL', '300'))
+
+# Не больше стольких сообщений в секунду от бота (лимит Telegram - 30)
+TELEGRAM_GLOBAL_RATE_LIMIT = int(os.getenv('TELEGRAM_GLOBAL_RATE_LIMIT', '25'))
+
+# Окно объединения серии сообщений в одно Telegram-уведомление (сек)
+TELEGRAM_COALESCE_SECONDS = int(os.getenv('TELEGRAM_COALESCE_SECONDS', '15'))
+
+# Аренда забранных воркером уведомлений (сек): после нее строки упавшего воркера возвращаются в очередь
+TELEGRAM_CLAIM_LEASE_SECONDS = int(os.getenv('TELEGRAM_CLAIM_LEASE_SECONDS', '900'))
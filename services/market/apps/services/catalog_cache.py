@@ -0,0 +1,124 @@
+# services/market/apps/services/catalog_cache.py
+"""
+Кэш ответов каталога для анонимных запросов (list, retrieve, subcategories).
+
+Ключ строится из вида ответа, хоста и нормализованных query-параметров.
+Инвалидация - через номер версии каталога: любое изменение услуг, их
+изображений или аватаров владельцев увеличивает версию, и все старые
+ключи перестают читаться (и истекают по TTL). Если ключ версии вытеснен
+из Redis, новая версия берется из time.time_ns(), а не с 1: номер никогда
+не возвращается к уже использованному, и старые ответы не оживают.
+
+Кэш необязателен: ошибка Redis при чтении считается промахом, запись и
+счетчики статистики при ошибке пропускаются, каталог отдается из БД.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from redis import RedisError
+
+VERSION_KEY = 'catalog:version'
+STATS_KEY_PREFIX = 'catalog:stats'
+STATS_KINDS = ('list', 'retrieve', 'subcategories')
+
+
+def _seed_version() -> int:
+    """Начальная версия - текущее время в нс, заведомо больше ранее выданных"""
+    return time.time_ns()
+
+
+def _get_version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        seed = _seed_version()
+        cache.add(VERSION_KEY, seed, timeout=None)
+        version = cache.get(VERSION_KEY, seed)
+    return version
+
+
+def _build_key(kind: str, request, extra: str = '') -> str:
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    raw = f"{request.get_host()}|{extra}|{params}"
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:{_get_version()}:{kind}:{digest}"
+
+
+def _count(kind: str, outcome: str) -> None:
+    """Счетчик статистики (best effort - потерянное значение не мешает ответу)"""
+    key = f"{STATS_KEY_PREFIX}:{kind}:{outcome}"
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключа еще нет - создаем (add не перезапишет значение, если его успели создать)
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+    except (RedisError, ValueError):
+        pass
+
+
+def get_response(kind: str, request, extra: str = ''):
+    """Данные закэшированного ответа или None (в том числе если Redis недоступен)"""
+    try:
+        data = cache.get(_build_key(kind, request, extra))
+    except RedisError as e:
+        print(f"⚠️ Кэш каталога недоступен, ответ строится из БД: {e}")
+        return None
+    _count(kind, 'hits' if data is not None else 'misses')
+    return data
+
+
+def set_response(kind: str, request, data, extra: str = '') -> None:
+    try:
+        cache.set(_build_key(kind, request, extra), data, settings.CATALOG_CACHE_TIMEOUT)
+    except RedisError as e:
+        print(f"⚠️ Не удалось сохранить ответ каталога в кэш: {e}")
+
+
+def invalidate() -> None:
+    """Сбросить кэш каталога после коммита текущей транзакции"""
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version() -> None:
+    try:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, _seed_version(), timeout=None)
+    except RedisError as e:
+        # Изменение уже закоммичено; старые ответы истекут по TTL
+        print(f"🔥 Не удалось сбросить кэш каталога: {e}")
+
+
+def get_stats() -> dict:
+    keys = [
+        f"{STATS_KEY_PREFIX}:{kind}:{outcome}"
+        for kind in STATS_KINDS
+        for outcome in ('hits', 'misses')
+    ]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for kind in STATS_KINDS:
+        hits = values.get(f"{STATS_KEY_PREFIX}:{kind}:hits", 0)
+        misses = values.get(f"{STATS_KEY_PREFIX}:{kind}:misses", 0)
+        total = hits + misses
+        stats[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else 0,
+        }
+    return stats
+
+
+def reset_stats() -> None:
+    cache.delete_many([
+        f"{STATS_KEY_PREFIX}:{kind}:{outcome}"
+        for kind in STATS_KINDS
+        for outcome in ('hits', 'misses')
+    ])
@@ -0,0 +1,248 @@
+# services/market/apps/services/chat_outbox.py
+"""
+Outbox для побочных эффектов заказов: сообщения и карточки в чате,
+уведомление администратору о споре.
+
+DealService только записывает ChatOutboxEvent в транзакции перехода статуса.
+После коммита события заказа доставляются фоновым потоком строго по порядку id:
+ошибка доставки останавливает очередь этого заказа до следующей попытки
+(экспоненциальная задержка), чтобы карточка не обогнала предшествующее
+ей сообщение. Отложенные события досылает команда dispatch_chat_outbox.
+
+Транзакция не держится во время HTTP-запроса: событие забирается короткой
+транзакцией (статус sending с арендой CHAT_OUTBOX_CLAIM_LEASE_SECONDS),
+отправляется без транзакции, а результат сохраняется отдельным UPDATE.
+Пока аренда не истекла, другие диспетчеры не трогают очередь заказа;
+событие упавшего диспетчера отправляется повторно после ее истечения.
+"""
+import os
+import threading
+from datetime import timedelta
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import http_client
+from .models import ChatOutboxEvent, Deal
+
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 600
+TELEGRAM_REQUEST_TIMEOUT = 10
+
+# Заказы, для которых сейчас работает фоновый поток, и заказы,
+# в которые за это время добавились новые события
+_running = set()
+_rerun = set()
+_lock = threading.Lock()
+
+
+class DeliveryError(Exception):
+    """Временная ошибка доставки - событие будет отправлено повторно"""
+
+
+class PermanentDeliveryError(DeliveryError):
+    """Чат отклонил запрос (4xx) - повторять бессмысленно"""
+
+
+def enqueue(deal: Deal, kind: str, payload: dict) -> ChatOutboxEvent:
+    """
+    Записать событие в текущей транзакции и запланировать доставку после коммита.
+    Токены пользователей не сохраняются: чат получает сервисный токен,
+    а инициатор передается в payload (sender_id).
+    """
+    event = ChatOutboxEvent.objects.create(deal=deal, kind=kind, payload=payload)
+    deal_id = deal.id
+    transaction.on_commit(lambda: dispatch_in_background(deal_id))
+    return event
+
+
+def dispatch_in_background(deal_id) -> None:
+    """Запустить доставку событий заказа в отдельном потоке (не дольше одного потока на заказ)"""
+    with _lock:
+        if deal_id in _running:
+            _rerun.add(deal_id)
+            return
+        _running.add(deal_id)
+
+    threading.Thread(target=_dispatch_worker, args=(deal_id,), daemon=True).start()
+
+
+def _dispatch_worker(deal_id) -> None:
+    try:
+        while True:
+            try:
+                dispatch_deal(deal_id)
+            except Exception as e:
+                print(f"🔥 Error dispatching chat events for deal {deal_id}: {e}")
+
+            with _lock:
+                if deal_id in _rerun:
+                    _rerun.discard(deal_id)
+                    continue
+                _running.discard(deal_id)
+                return
+    finally:
+        connection.close()
+
+
+def dispatch_deal(deal_id) -> int:
+    """
+    Доставить ожидающие события заказа по порядку.
+    Возвращает число доставленных событий.
+    """
+    delivered = 0
+    while True:
+        event = _claim_next(deal_id)
+        if event is None:
+            return delivered
+
+        if not _deliver(event):
+            return delivered
+        if event.status == 'delivered':
+            delivered += 1
+
+
+def _claim_next(deal_id) -> Optional[ChatOutboxEvent]:
+    """
+    Забрать первое недоставленное событие заказа, если его время наступило
+    и его не отправляет другой диспетчер (короткая транзакция).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        event = (
+            ChatOutboxEvent.objects
+            .select_for_update(of=('self',))
+            .select_related('deal')
+            .filter(deal_id=deal_id, status__in=('pending', 'sending'))
+            .order_by('id')
+            .first()
+        )
+        if event is None:
+            return None
+        if event.status == 'sending' and event.claimed_until and event.claimed_until > now:
+            return None
+        if event.status == 'pending' and event.next_attempt_at > now:
+            return None
+
+        event.status = 'sending'
+        event.claimed_until = now + timedelta(seconds=settings.CHAT_OUTBOX_CLAIM_LEASE_SECONDS)
+        event.save(update_fields=['status', 'claimed_until'])
+    return event
+
+
+def dispatch_due() -> int:
+    """Доставить все события, время попытки которых наступило (для dispatch_chat_outbox)"""
+    now = timezone.now()
+    deal_ids = (
+        ChatOutboxEvent.objects
+        .filter(
+            Q(status='pending', next_attempt_at__lte=now)
+            | Q(status='sending', claimed_until__lte=now)
+        )
+        .order_by()
+        .values_list('deal_id', flat=True)
+        .distinct()
+    )
+    return sum(dispatch_deal(deal_id) for deal_id in list(deal_ids))
+
+
+def _deliver(event: ChatOutboxEvent) -> bool:
+    """
+    Отправить забранное событие (без транзакции) и сохранить результат попытки.
+    Возвращает False, если событие отложено и очередь заказа нужно остановить.
+    """
+    event.attempts += 1
+    try:
+        if event.kind == 'admin_telegram':
+            _send_admin_telegram(event)
+        else:
+            _send_to_chat(event)
+    except (requests.RequestException, DeliveryError) as e:
+        event.last_error = str(e)[:1000]
+        if isinstance(e, PermanentDeliveryError) or event.attempts >= MAX_ATTEMPTS:
+            event.status = 'failed'
+            print(f"🔥 Chat event {event.id} ({event.kind}) for deal {event.deal_id} failed: {e}")
+        else:
+            delay = min(2 ** event.attempts, MAX_BACKOFF_SECONDS)
+            event.status = 'pending'
+            event.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            print(f"⚠️ Chat event {event.id} ({event.kind}) will be retried in {delay}s: {e}")
+        event.claimed_until = None
+        event.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error', 'claimed_until'])
+        # failed-событие больше не держит очередь заказа
+        return event.status == 'failed'
+
+    event.status = 'delivered'
+    event.delivered_at = timezone.now()
+    event.last_error = ''
+    event.claimed_until = None
+    event.save(update_fields=['attempts', 'status', 'delivered_at', 'last_error', 'claimed_until'])
+    return True
+
+
+def _get_system_token() -> str:
+    from .jwt_service import ServiceJWT
+
+    return ServiceJWT.get_service_token('market-service', expires_minutes=5)
+
+
+def _send_to_chat(event: ChatOutboxEvent) -> None:
+    deal = event.deal
+    url = f"{settings.CHAT_SERVICE_URL}/api/chat/rooms/{deal.chat_room_id}/send_deal_message/"
+
+    payload = dict(event.payload)
+    # Карточка обновляет сообщение, созданное первой доставленной карточкой заказа
+    if event.kind == 'deal_card' and deal.last_message_id:
+        payload['update_message_id'] = str(deal.last_message_id)
+
+    response = _post_to_chat(url, payload, _get_system_token())
+
+    if response.status_code != 200:
+        error = f"Chat responded {response.status_code}: {response.text[:200]}"
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentDeliveryError(error)
+        raise DeliveryError(error)
+
+    if event.kind == 'deal_card' and not deal.last_message_id:
+        response_data = response.json()
+        message_id = (response_data.get('data') or {}).get('id')
+        if response_data.get('status') == 'success' and message_id:
+            Deal.objects.filter(pk=deal.pk, last_message_id__isnull=True).update(
+                last_message_id=message_id
+            )
+
+
+def _post_to_chat(url: str, payload: dict, auth_token: str) -> requests.Response:
+    headers = {
+        'Authorization': f'Bearer {auth_token}',
+        'Content-Type': 'application/json'
+    }
+    return http_client.post(url, endpoint='chat.send_deal_message', headers=headers, json=payload)
+
+
+def _send_admin_telegram(event: ChatOutboxEvent) -> None:
+    bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
+    admin_id = os.getenv('TELEGRAM_ADMIN_ID')
+
+    if not bot_token or not admin_id:
+        print("⚠️ TELEGRAM_BOT_TOKEN или TELEGRAM_ADMIN_ID не настроены")
+        return
+
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    data = {
+        'chat_id': admin_id,
+        'text': event.payload.get('text', ''),
+        'parse_mode': 'HTML'
+    }
+
+    response = http_client.post(
+        url, endpoint='telegram.sendMessage', json=data, timeout=TELEGRAM_REQUEST_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise DeliveryError(f"Telegram responded {response.status_code}: {response.text[:200]}")
+
+    print(f"✅ Уведомление о споре {event.deal_id} отправлено в Telegram")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from ... import catalog_cache
+
+
+class Command(BaseCommand):
+    help = 'Показать счетчики попаданий/промахов кэша каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        for kind, stats in catalog_cache.get_stats().items():
+            self.stdout.write(
+                f"{kind}: hits={stats['hits']} misses={stats['misses']} hit_ratio={stats['hit_ratio']}"
+            )
+
+        if options['reset']:
+            catalog_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
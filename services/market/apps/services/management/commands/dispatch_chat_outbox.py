@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from ...chat_outbox import dispatch_due
+
+
+class Command(BaseCommand):
+    help = 'Доставить в чат отложенные события заказов (повторные попытки outbox)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Пауза между проходами в секундах (для --loop)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = dispatch_due()
+            if delivered or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Доставлено событий: {delivered}'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ...models import ServiceTag
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать словарь тегов (ServiceTag) по активным услугам'
+
+    def handle(self, *args, **options):
+        count = ServiceTag.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Словарь тегов пересобран: {count} тегов'))
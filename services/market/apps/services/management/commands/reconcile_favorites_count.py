@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ...models import Favorite
+
+
+class Command(BaseCommand):
+    help = 'Сверить Service.favorites_count с таблицей избранного и исправить расхождения'
+
+    def handle(self, *args, **options):
+        fixed = Favorite.reconcile_counts()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счетчиков избранного: {fixed}'))
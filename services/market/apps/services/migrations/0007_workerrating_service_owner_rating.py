@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_worker_ratings(apps, schema_editor):
+    """Посчитать агрегаты по уже существующим отзывам"""
+    Review = apps.get_model("services", "Review")
+    Service = apps.get_model("services", "Service")
+    WorkerRating = apps.get_model("services", "WorkerRating")
+
+    rows = (
+        Review.objects.values("reviewee_id")
+        .annotate(reviews_count=Count("id"), rating_sum=Sum("rating"))
+        .order_by()
+    )
+
+    for row in rows:
+        avg_rating = (
+            Decimal(row["rating_sum"]) / row["reviews_count"]
+        ).quantize(Decimal("0.01"))
+
+        WorkerRating.objects.update_or_create(
+            worker_id=row["reviewee_id"],
+            defaults={
+                "reviews_count": row["reviews_count"],
+                "rating_sum": row["rating_sum"],
+                "avg_rating": avg_rating,
+            },
+        )
+        Service.objects.filter(owner_id=row["reviewee_id"]).update(owner_rating=avg_rating)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0006_favorite_service_services_price_e2d79c_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkerRating",
+            fields=[
+                (
+                    "worker_id",
+                    models.UUIDField(
+                        help_text="ID исполнителя",
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("reviews_count", models.PositiveIntegerField(default=0)),
+                ("rating_sum", models.PositiveIntegerField(default=0)),
+                (
+                    "avg_rating",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=3),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "worker_ratings",
+            },
+        ),
+        migrations.AddField(
+            model_name="service",
+            name="owner_rating",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                help_text="Средний рейтинг владельца (копия WorkerRating.avg_rating для сортировки)",
+                max_digits=3,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                fields=["is_active", "-owner_rating", "-created_at"],
+                name="services_is_acti_f151fa_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_worker_ratings, migrations.RunPython.noop),
+    ]
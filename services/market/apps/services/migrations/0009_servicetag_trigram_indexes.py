@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:25
+
+from collections import Counter
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import uuid
+
+
+def build_tag_dictionary(apps, schema_editor):
+    """Первичное наполнение словаря тегов по активным услугам"""
+    Service = apps.get_model("services", "Service")
+    ServiceTag = apps.get_model("services", "ServiceTag")
+
+    counts = Counter()
+    for tags in Service.objects.filter(is_active=True).values_list("tags", flat=True):
+        if isinstance(tags, list):
+            counts.update({tag.strip() for tag in tags if isinstance(tag, str) and tag.strip()})
+
+    ServiceTag.objects.bulk_create(
+        [ServiceTag(name=name, services_count=count) for name, count in counts.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0008_service_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name="ServiceTag",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                (
+                    "services_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Число активных услуг с тегом"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "service_tags",
+                "ordering": ["-services_count", "name"],
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["name"],
+                        name="service_tags_name_trgm",
+                        opclasses=["gin_trgm_ops"],
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"], name="services_title_trgm", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+        migrations.RunPython(build_tag_dictionary, migrations.RunPython.noop),
+    ]
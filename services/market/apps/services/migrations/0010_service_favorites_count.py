@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorites_count(apps, schema_editor):
+    Favorite = apps.get_model("services", "Favorite")
+    Service = apps.get_model("services", "Service")
+
+    Service.objects.update(
+        favorites_count=Coalesce(
+            Subquery(
+                Favorite.objects.filter(service=OuterRef("pk"))
+                .order_by()
+                .values("service")
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0009_servicetag_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Сколько раз услугу добавили в избранное (для сортировки по популярности)",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="service",
+            index=models.Index(
+                fields=["is_active", "-favorites_count", "-created_at"],
+                name="services_is_acti_fa0f30_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_favorites_count, migrations.RunPython.noop),
+    ]
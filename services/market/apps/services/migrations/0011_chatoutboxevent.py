@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0010_service_favorites_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatOutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("text", "Текстовое сообщение"),
+                            ("deal_card", "Карточка заказа"),
+                            ("admin_telegram", "Уведомление администратору"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "auth_token",
+                    models.TextField(
+                        blank=True,
+                        help_text="Токен инициатора; пусто - системный токен",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("delivered", "Доставлено"),
+                            ("failed", "Не доставлено"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "deal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_events",
+                        to="services.deal",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "chat_outbox_events",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"],
+                        name="chat_outbox_status_d4d03a_idx",
+                    ),
+                    models.Index(
+                        fields=["deal", "status", "id"],
+                        name="chat_outbox_deal_id_b21cb7_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0011_chatoutboxevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatoutboxevent",
+            name="claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Аренда диспетчера: после нее событие отправляется повторно",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="chatoutboxevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sending", "Отправляется"),
+                    ("delivered", "Доставлено"),
+                    ("failed", "Не доставлено"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0012_chatoutboxevent_claimed_until"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="chatoutboxevent",
+            name="auth_token",
+        ),
+    ]
@@ -1,9 +1,17 @@
 # services/market/apps/services/models.py
 import uuid
-from django.db import models
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import os
 import bleach
+from . import catalog_cache
 
 
 def validate_tags(value):
@@ -125,6 +133,12 @@ class Service(models.Model):
     owner_id = models.UUIDField(db_index=True)
     owner_name = models.CharField(max_length=255, blank=True)
     owner_avatar = models.TextField(blank=True, null=True)
+    owner_rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        help_text="Средний рейтинг владельца (копия WorkerRating.avg_rating для сортировки)"
+    )
 
     ai_template = models.TextField(
         blank=True, 
@@ -159,6 +173,14 @@ class Service(models.Model):
         help_text="Активно ли объявление (требует активной подписки)"
     )
     
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Сколько раз услугу добавили в избранное (для сортировки по популярности)"
+    )
+    
+    # Взвешенный tsvector (title > tags > description), поддерживается триггером в БД
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -171,6 +193,10 @@ class Service(models.Model):
             models.Index(fields=['owner_id']),
             models.Index(fields=['is_active', '-created_at']),
             models.Index(fields=['-price']),  # Для сортировки по цене
+            models.Index(fields=['is_active', '-owner_rating', '-created_at']),  # Для сортировки по рейтингу
+            models.Index(fields=['is_active', '-favorites_count', '-created_at']),  # Для сортировки по популярности
+            GinIndex(fields=['search_vector'], name='services_search_vector_gin'),  # Полнотекстовый поиск
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='services_title_trgm'),  # Подсказки
         ]
 
     def __str__(self) -> str:
@@ -208,6 +234,74 @@ class Service(models.Model):
             )
 
 
+class ServiceTag(models.Model):
+    """Словарь уникальных тегов услуг (для подсказок в поиске)"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=50, unique=True)
+    services_count = models.PositiveIntegerField(default=0, help_text="Число активных услуг с тегом")
+
+    class Meta:
+        db_table = 'service_tags'
+        ordering = ['-services_count', 'name']
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='service_tags_name_trgm'),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+    @staticmethod
+    def counted_tags(service) -> set:
+        """Теги, которые услуга вносит в счетчики словаря (только активная услуга)"""
+        if not service.is_active or not isinstance(service.tags, list):
+            return set()
+        return {tag.strip() for tag in service.tags if isinstance(tag, str) and tag.strip()}
+
+    @classmethod
+    def track(cls, before, after) -> None:
+        """
+        Учесть изменение тегов услуги: before/after - результат counted_tags
+        до и после сохранения. Счетчики меняются F-выражениями, поэтому
+        параллельные правки разных услуг не теряют друг друга.
+        """
+        deltas = {name: 1 for name in after - before}
+        deltas.update({name: -1 for name in before - after})
+        cls.adjust_counts(deltas)
+
+    @classmethod
+    def adjust_counts(cls, deltas) -> None:
+        """Изменить счетчики тегов на deltas {name: +n/-n}, не опуская ниже нуля"""
+        added = [name for name, delta in deltas.items() if delta > 0]
+        if added:
+            cls.objects.bulk_create([cls(name=name) for name in added], ignore_conflicts=True)
+
+        by_delta = defaultdict(list)
+        for name, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(name)
+        for delta, names in by_delta.items():
+            cls.objects.filter(name__in=names).update(
+                services_count=Greatest(F('services_count') + delta, Value(0))
+            )
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Полностью пересобрать словарь по тегам активных услуг"""
+        counts = Counter()
+        for tags in Service.objects.filter(is_active=True).values_list('tags', flat=True).iterator():
+            if isinstance(tags, list):
+                counts.update({tag.strip() for tag in tags if isinstance(tag, str) and tag.strip()})
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(name=name, services_count=count) for name, count in counts.items()
+            ])
+
+        return len(counts)
+
+
 class ServiceImage(models.Model):
     """Изображения для услуги (до 5 шт)"""
     
@@ -251,6 +345,36 @@ class Favorite(models.Model):
     def __str__(self) -> str:
         return f"User {self.user_id} favorited {self.service.title}"
 
+    @classmethod
+    def reconcile_counts(cls) -> int:
+        """Пересчитать Service.favorites_count по таблице избранного, вернуть число исправленных услуг"""
+        actual_count = Coalesce(
+            Subquery(
+                cls.objects.filter(service=OuterRef('pk'))
+                .order_by()
+                .values('service')
+                .annotate(total=Count('id'))
+                .values('total')
+            ),
+            0
+        )
+        return Service.objects.exclude(
+            favorites_count=actual_count
+        ).update(favorites_count=actual_count)
+
+    @classmethod
+    def get_favorited_ids(cls, user_id, service_ids) -> set:
+        """ID услуг из переданного набора, которые пользователь добавил в избранное (один запрос)"""
+        if not service_ids:
+            return set()
+
+        return set(
+            cls.objects.filter(
+                user_id=user_id,
+                service_id__in=service_ids
+            ).values_list('service_id', flat=True)
+        )
+
 
 class Deal(models.Model):
     """МОДЕЛЬ ЗАКАЗА С ПОДДЕРЖКОЙ АРБИТРАЖА"""
@@ -430,3 +554,91 @@ class Review(models.Model):
     class Meta:
         db_table = 'reviews'
         ordering = ['-created_at']
+
+
+class WorkerRating(models.Model):
+    """Агрегированный рейтинг исполнителя, обновляется при записи отзыва"""
+
+    worker_id = models.UUIDField(primary_key=True, help_text="ID исполнителя")
+    reviews_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'worker_ratings'
+
+    def __str__(self) -> str:
+        return f"Rating {self.avg_rating} ({self.reviews_count}) for worker {self.worker_id}"
+
+    @classmethod
+    def register_review(cls, worker_id, rating: int) -> 'WorkerRating':
+        """
+        Учесть новый отзыв в агрегате и синхронизировать owner_rating в услугах.
+        Вызывается внутри транзакции, в которой создается Review.
+        """
+        cls.objects.get_or_create(worker_id=worker_id)
+        worker_rating = cls.objects.select_for_update().get(worker_id=worker_id)
+
+        worker_rating.reviews_count += 1
+        worker_rating.rating_sum += rating
+        worker_rating.avg_rating = (
+            Decimal(worker_rating.rating_sum) / worker_rating.reviews_count
+        ).quantize(Decimal('0.01'))
+        worker_rating.save()
+
+        Service.objects.filter(owner_id=worker_id).update(owner_rating=worker_rating.avg_rating)
+        catalog_cache.invalidate()
+        return worker_rating
+
+    @classmethod
+    def get_avg_rating(cls, worker_id) -> Decimal:
+        """Текущий средний рейтинг исполнителя (0, если отзывов нет)"""
+        avg_rating = cls.objects.filter(worker_id=worker_id).values_list('avg_rating', flat=True).first()
+        return avg_rating if avg_rating is not None else Decimal('0')
+
+
+class ChatOutboxEvent(models.Model):
+    """
+    Исходящее событие для чата (сообщение, карточка заказа, уведомление админу).
+    Пишется в той же транзакции, что и изменение заказа, и доставляется
+    после коммита фоновым диспетчером (см. chat_outbox.py).
+    Автоинкрементный id задает порядок доставки событий одного заказа.
+    """
+    KIND_CHOICES = [
+        ('text', 'Текстовое сообщение'),
+        ('deal_card', 'Карточка заказа'),
+        ('admin_telegram', 'Уведомление администратору'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('delivered', 'Доставлено'),
+        ('failed', 'Не доставлено'),
+    ]
+
+    deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name='chat_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_until = models.DateTimeField(
+        null=True, blank=True, help_text="Аренда диспетчера: после нее событие отправляется повторно"
+    )
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'chat_outbox_events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['deal', 'status', 'id']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} for Deal {self.deal_id} ({self.status})"
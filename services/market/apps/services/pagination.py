@@ -0,0 +1,153 @@
+# services/market/apps/services/pagination.py
+import base64
+import json
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple('Cursor', ['values', 'reverse'])
+
+
+class ServiceCursorPagination(BasePagination):
+    """
+    Keyset-пагинация каталога услуг.
+    Курсор хранит значения всех полей сортировки и id как уникальный
+    последний ключ, поэтому страницы не пропускают и не повторяют услуги
+    с одинаковым рейтингом, ценой или популярностью, а стоимость страницы
+    не зависит от глубины (индексы по -created_at, -price и т.д.).
+    Курсор привязан к своей сортировке: курсор другой сортировки или с
+    некорректными значениями отклоняется (404, как в CursorPagination).
+    Включается, только если клиент передал cursor или page_size.
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, view):
+        """Сортировка ServiceViewSet по параметру sort с id в конце для однозначности"""
+        ordering = tuple(view.get_ordering()) if hasattr(view, 'get_ordering') else self.ordering
+        if ordering[-1].lstrip('-') != 'id':
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.keyset = self.get_ordering(view)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor.reverse)
+
+        ordering = [self._flip(field) for field in self.keyset] if reverse else list(self.keyset)
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(ordering, cursor.values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Переход по курсору означает, что в обратную сторону страница есть
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, values):
+        """Строки строго после позиции values в порядке ordering (лексикографически)"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_field, prev_value in zip(ordering[:index], values[:index]):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    def _position(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.keyset]
+
+    def encode_cursor(self, values, reverse):
+        data = json.dumps({'k': list(self.keyset), 'v': values, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        encoded = base64.urlsafe_b64encode(data.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            keyset, values, reverse = data['k'], data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        # Курсор от другой сортировки
+        if keyset != list(self.keyset) or not isinstance(values, list) or len(values) != len(self.keyset):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [self._to_python(model, field, value) for field, value in zip(self.keyset, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(values, reverse)
+
+    @staticmethod
+    def _to_python(model, field, value):
+        """Значение ключа из курсора в тип поля (None в ключах не бывает)"""
+        if value is None:
+            raise ValueError('Empty cursor value')
+        name = field.lstrip('-')
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Аннотации сортировки (search_rank) - числа
+            return float(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'status': 'success',
+            'data': data,
+            'error': None,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        })
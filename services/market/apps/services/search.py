@@ -0,0 +1,26 @@
+# services/market/apps/services/search.py
+import re
+from django.contrib.postgres.search import SearchQuery
+
+# Конфигурация PostgreSQL FTS со стеммингом для русского языка
+SEARCH_CONFIG = 'russian'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_search_query(text: str):
+    """
+    Собирает tsquery из пользовательского ввода.
+    Все слова объединяются через AND, последнее слово ищется как префикс,
+    чтобы поиск работал по мере набора текста в SearchView.
+    Возвращает None, если во вводе нет ни одного слова.
+    """
+    words = WORD_RE.findall(text.lower())[:10]
+    if not words:
+        return None
+
+    # В словах только буквы/цифры/_, поэтому raw-запрос безопасен
+    terms = [f"'{word}'" for word in words]
+    terms[-1] = f"{terms[-1]}:*"
+
+    return SearchQuery(' & '.join(terms), search_type='raw', config=SEARCH_CONFIG)
@@ -1,10 +1,35 @@
 # services/market/apps/services/serializers.py
 from rest_framework import serializers
 from decimal import Decimal
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
 from .models import Service, ServiceImage, Deal, DealDeliveryAttachment, Transaction, Review, Favorite
 
 
+def get_media_base_url(request):
+    """
+    Базовый URL медиа-файлов для списков: MEDIA_BASE_URL из настроек
+    или абсолютный MEDIA_URL, вычисленный один раз на запрос.
+    """
+    if settings.MEDIA_BASE_URL:
+        return settings.MEDIA_BASE_URL
+    if request:
+        return request.build_absolute_uri(settings.MEDIA_URL)
+    return settings.MEDIA_URL
+
+
+class MediaImageField(serializers.ImageField):
+    """ImageField, который в списках строит URL от media_base_url без обращения к storage"""
+
+    def to_representation(self, value):
+        media_base_url = self.context.get('media_base_url')
+        if value and media_base_url:
+            return f"{media_base_url}{filepath_to_uri(value.name)}"
+        return super().to_representation(value)
+
+
 class ServiceImageSerializer(serializers.ModelSerializer):
+    image = MediaImageField(max_length=500)
     image_url = serializers.SerializerMethodField()
     
     class Meta:
@@ -17,6 +42,10 @@ class ServiceImageSerializer(serializers.ModelSerializer):
         if not obj.image:
             return None
         
+        media_base_url = self.context.get('media_base_url')
+        if media_base_url:
+            return f"{media_base_url}{filepath_to_uri(obj.image.name)}"
+        
         request = self.context.get('request')
         if request:
             return request.build_absolute_uri(obj.image.url)
@@ -41,6 +70,17 @@ class ServiceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'owner_id', 'images', 'subcategory_display', 'is_favorited']
     
+    def update(self, instance, validated_data):
+        """
+        Сохраняются только переданные поля: favorites_count и owner_rating
+        меняются параллельно F-выражениями, и полная запись строки вернула бы
+        их устаревшие значения.
+        """
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+    
     def get_owner_avatar(self, obj):
         if not obj.owner_avatar:
             return None
@@ -56,17 +96,11 @@ class ServiceSerializer(serializers.ModelSerializer):
         return obj.owner_avatar
     
     def get_owner_rating(self, obj):
-        """Получить средний рейтинг владельца услуги"""
-        from django.db.models import Avg
-        
-        avg_rating = Review.objects.filter(
-            reviewee_id=obj.owner_id
-        ).aggregate(avg=Avg('rating'))['avg']
-        
-        if avg_rating is None:
+        """Средний рейтинг владельца услуги (денормализован из WorkerRating)"""
+        if not obj.owner_rating:
             return 0
         
-        return round(float(avg_rating), 1)
+        return round(float(obj.owner_rating), 1)
     
     def get_subcategory_display(self, obj):
         """Возвращает читаемое название подкатегории"""
@@ -85,6 +119,11 @@ class ServiceSerializer(serializers.ModelSerializer):
         if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
             return False
         
+        favorited_ids = self.context.get('favorited_ids')
+        if favorited_ids is not None:
+            # Избранное для всей страницы получено заранее одним запросом
+            return obj.id in favorited_ids
+        
         return Favorite.objects.filter(user_id=request.user.id, service=obj).exists()
 
 
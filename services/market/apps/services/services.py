@@ -1,5 +1,5 @@
 import os
-import requests
+from . import http_client
 from django.conf import settings
 from .models import Service, Deal
 
@@ -82,7 +82,9 @@ class AIService:
 
             print(f"🔄 [Market] Генерация ТЗ (YandexGPT - Business Analyst Mode)...")
             
-            response = requests.post(url, headers=headers, json=payload, timeout=90)
+            response = http_client.post(
+                url, endpoint='yandexgpt.completion', headers=headers, json=payload, timeout=90
+            )
             
             if response.status_code == 200:
                 data = response.json()
@@ -126,7 +128,7 @@ class OrderService:
             try:
                 chat_url = f"{settings.CHAT_SERVICE_URL}/api/chat/rooms/"
                 headers = {'Authorization': f'Bearer {auth_token}', 'Content-Type': 'application/json'}
-                resp = requests.post(chat_url, headers=headers, json={'member_ids': [str(client_id), str(service.owner_id)]}, timeout=5)
+                resp = http_client.post(chat_url, endpoint='chat.create_room', headers=headers, json={'member_ids': [str(client_id), str(service.owner_id)]})
 
                 if resp.status_code == 201:
                     room_id = resp.json()['data']['id']
@@ -134,11 +136,11 @@ class OrderService:
                     if len(agreed_tz) > 2000:
                         tz_msg = f"📋 НОВЫЙ ЗАКАЗ\n\n{agreed_tz[:1500]}...\n\n_(Полное ТЗ доступно в деталях заказа)_"
 
-                    requests.post(
+                    http_client.post(
                         f"{settings.CHAT_SERVICE_URL}/api/chat/rooms/{room_id}/send_message/",
+                        endpoint='chat.send_message',
                         headers=headers,
-                        json={'sender_id': str(client_id), 'text': tz_msg, 'is_system': False},
-                        timeout=5
+                        json={'sender_id': str(client_id), 'text': tz_msg, 'is_system': False}
                     )
             except Exception as e:
                 print(f"Chat error: {e}")
@@ -1,3 +1,336 @@
-from django.test import TestCase
+import base64
+import json
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import catalog_cache, chat_outbox
+from .authentication import RemoteUser
+from .jwt_service import ServiceJWT
+from .models import ChatOutboxEvent, Deal, Favorite, Service, ServiceTag
+from .views import ServiceViewSet
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _chat_response(status_code=200, message_id=None):
+    response = mock.Mock(status_code=status_code, text='')
+    response.json.return_value = {
+        'status': 'success',
+        'data': {'id': message_id or str(uuid.uuid4())},
+    }
+    return response
+
+
+class ChatOutboxDeliveryTests(TestCase):
+    def setUp(self):
+        self.deal = Deal.objects.create(
+            chat_room_id=uuid.uuid4(),
+            client_id=uuid.uuid4(),
+            worker_id=uuid.uuid4(),
+            title='Лендинг',
+            description='ТЗ',
+            price=15000,
+        )
+
+    def _event(self, kind='deal_card', **fields):
+        payload = {
+            'sender_id': str(self.deal.client_id),
+            'message_type': kind,
+            'text': '📋 Создан заказ: Лендинг',
+            'deal_data': {'deal_id': str(self.deal.id)},
+        }
+        return ChatOutboxEvent.objects.create(deal=self.deal, kind=kind, payload=payload, **fields)
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_event_is_delivered_with_service_token(self, post):
+        message_id = str(uuid.uuid4())
+        post.return_value = _chat_response(message_id=message_id)
+        event = self._event()
+
+        self.assertEqual(chat_outbox.dispatch_deal(self.deal.id), 1)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'delivered')
+        self.assertIsNone(event.claimed_until)
+
+        url = post.call_args.args[0]
+        self.assertIn(f'/rooms/{self.deal.chat_room_id}/send_deal_message/', url)
+        token = post.call_args.kwargs['headers']['Authorization'].split()[1]
+        self.assertEqual(ServiceJWT.verify_service_token(token)['service'], 'market-service')
+        self.assertEqual(post.call_args.kwargs['json']['sender_id'], str(self.deal.client_id))
+
+        self.deal.refresh_from_db()
+        self.assertEqual(str(self.deal.last_message_id), message_id)
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_events_are_delivered_in_order(self, post):
+        post.return_value = _chat_response()
+        first = self._event(kind='text')
+        second = self._event()
+
+        self.assertEqual(chat_outbox.dispatch_deal(self.deal.id), 2)
+
+        kinds = [call.kwargs['json']['message_type'] for call in post.call_args_list]
+        self.assertEqual(kinds, [first.kind, second.kind])
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_rejected_event_fails_without_blocking_the_queue(self, post):
+        post.side_effect = [_chat_response(status_code=403), _chat_response()]
+        rejected = self._event(kind='text')
+        next_event = self._event()
+
+        self.assertEqual(chat_outbox.dispatch_deal(self.deal.id), 1)
+
+        rejected.refresh_from_db()
+        next_event.refresh_from_db()
+        self.assertEqual(rejected.status, 'failed')
+        self.assertEqual(next_event.status, 'delivered')
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_server_error_is_retried_later(self, post):
+        post.return_value = _chat_response(status_code=503)
+        event = self._event()
+
+        self.assertEqual(chat_outbox.dispatch_deal(self.deal.id), 0)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertIsNone(event.claimed_until)
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_event_claimed_by_another_dispatcher_is_not_sent(self, post):
+        self._event(status='sending', claimed_until=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(chat_outbox.dispatch_deal(self.deal.id), 0)
+        post.assert_not_called()
+
+    @mock.patch('apps.services.chat_outbox.http_client.post')
+    def test_event_with_expired_lease_is_sent_again(self, post):
+        post.return_value = _chat_response()
+        event = self._event(status='sending', claimed_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(chat_outbox.dispatch_due(), 1)
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'delivered')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ServiceCursorPaginationTests(TestCase):
+    url = '/api/market/services/'
+
+    def setUp(self):
+        self.client = APIClient()
+        owner_id = uuid.uuid4()
+        # Одинаковые рейтинг и популярность - порядок определяют created_at и id
+        self.services = [
+            Service.objects.create(
+                owner_id=owner_id,
+                title=f'Услуга {index}',
+                description='Описание',
+                price=1000 + index * 500,
+            )
+            for index in range(5)
+        ]
+
+    def _collect(self, sort):
+        ids, url = [], f'{self.url}?sort={sort}&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.data['data']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_duplicated_sort_keys_once(self):
+        for sort in ('rating', 'popular', 'price_asc', '-created_at'):
+            ids = self._collect(sort)
+            self.assertEqual(len(ids), len(self.services), sort)
+            self.assertEqual(set(ids), {str(service.id) for service in self.services}, sort)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get(f'{self.url}?sort=rating&page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [item['id'] for item in back.data['data']],
+            [item['id'] for item in first.data['data']],
+        )
+
+    def test_cursor_from_another_sort_is_rejected(self):
+        response = self.client.get(f'{self.url}?sort=price_asc&page_size=2')
+        cursor = response.data['next'].split('cursor=')[1].split('&')[0]
+
+        for sort in ('popular', 'rating'):
+            response = self.client.get(f'{self.url}?sort={sort}&page_size=2&cursor={cursor}')
+            self.assertEqual(response.status_code, 404, sort)
+
+    def test_tampered_cursor_values_are_rejected(self):
+        keyset = ['-favorites_count', '-created_at', '-id']
+        data = {'k': keyset, 'v': ['1500.00', timezone.now().isoformat(), str(uuid.uuid4())], 'r': 0}
+        cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        response = self.client.get(f'{self.url}?sort=popular&page_size=2&cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(f'{self.url}?sort=popular&page_size=2&cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FavoritesCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = RemoteUser({'user_id': str(uuid.uuid4()), 'role': 'client'})
+        self.client.force_authenticate(user=self.user)
+        self.service = Service.objects.create(
+            owner_id=uuid.uuid4(), title='Лендинг', description='Описание', price=15000
+        )
+
+    def _count(self):
+        self.service.refresh_from_db(fields=['favorites_count'])
+        return self.service.favorites_count
+
+    def test_toggle_adds_and_removes_once(self):
+        url = '/api/market/favorites/toggle/'
+
+        self.client.post(url, {'service_id': str(self.service.id)}, format='json')
+        self.assertEqual(self._count(), 1)
+
+        self.client.post(url, {'service_id': str(self.service.id)}, format='json')
+        self.assertEqual(self._count(), 0)
+
+    def test_repeated_add_is_counted_once(self):
+        for _ in range(2):
+            self.client.post('/api/market/favorites/', {'service_id': str(self.service.id)}, format='json')
+
+        self.assertEqual(self._count(), 1)
+
+    def test_racing_delete_decrements_once(self):
+        other = Service.objects.create(
+            owner_id=uuid.uuid4(), title='Логотип', description='Описание', price=5000
+        )
+        Favorite.objects.create(user_id=uuid.uuid4(), service=other)
+        Service.objects.filter(pk=other.pk).update(favorites_count=1)
+        favorite = Favorite.objects.create(user_id=self.user.id, service=self.service)
+        Service.objects.filter(pk=self.service.pk).update(favorites_count=2)
+
+        # Второй запрос загрузил запись до того, как первый ее удалил
+        stale = Favorite.objects.get(pk=favorite.pk)
+        self.client.delete(f'/api/market/favorites/{favorite.pk}/')
+        with mock.patch.object(Favorite.objects, 'get', return_value=stale):
+            self.client.delete(f'/api/market/favorites/{favorite.pk}/')
+
+        self.assertEqual(self._count(), 1)
+
+    def test_owner_update_keeps_concurrent_counters(self):
+        owner = RemoteUser({'user_id': str(self.service.owner_id), 'role': 'worker'})
+        self.client.force_authenticate(user=owner)
+        stale = Service.objects.get(pk=self.service.pk)
+        Service.objects.filter(pk=self.service.pk).update(favorites_count=7, owner_rating='4.50')
+
+        with mock.patch.object(ServiceViewSet, 'get_object', return_value=stale):
+            response = self.client.patch(
+                f'/api/market/services/{self.service.pk}/', {'title': 'Лендинг под ключ'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.title, 'Лендинг под ключ')
+        self.assertEqual(self.service.favorites_count, 7)
+        self.assertEqual(str(self.service.owner_rating), '4.50')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ServiceTagCountTests(TestCase):
+    def setUp(self):
+        self.owner_id = uuid.uuid4()
+        self.client = APIClient()
+        self.client.force_authenticate(user=RemoteUser({'user_id': str(self.owner_id), 'role': 'worker'}))
+        self.service = Service.objects.create(
+            owner_id=self.owner_id, title='Лендинг', description='Описание', price=15000,
+            tags=['django', 'vue'],
+        )
+        ServiceTag.rebuild()
+
+    def _counts(self):
+        return dict(ServiceTag.objects.values_list('name', 'services_count'))
+
+    def test_edit_moves_counts_between_tags(self):
+        response = self.client.patch(
+            f'/api/market/services/{self.service.pk}/', {'tags': ['django', 'react']}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._counts(), {'django': 1, 'vue': 0, 'react': 1})
+
+    def test_deactivate_and_delete_decrement(self):
+        Service.objects.create(
+            owner_id=uuid.uuid4(), title='Бот', description='Описание', price=5000, tags=['django'],
+        )
+        ServiceTag.rebuild()
+
+        self.client.post('/api/market/services/deactivate-all/')
+        self.assertEqual(self._counts(), {'django': 1, 'vue': 0})
+
+        self.client.delete(f'/api/market/services/{self.service.pk}/')
+        self.assertEqual(self._counts(), {'django': 1, 'vue': 0})
+
+    def test_counts_never_go_negative(self):
+        ServiceTag.adjust_counts({'vue': -3})
+
+        self.assertEqual(self._counts()['vue'], 0)
+
+    def test_suggestions_skip_unused_tags(self):
+        ServiceTag.adjust_counts({'vue': -1})
+
+        response = self.client.get('/api/market/services/suggest/', {'q': 'vue'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('vue', response.data['data']['tags'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MinRatingFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Service.objects.create(
+            owner_id=uuid.uuid4(), title='Лендинг', description='Описание', price=15000, owner_rating='4.80'
+        )
+        Service.objects.create(
+            owner_id=uuid.uuid4(), title='Логотип', description='Описание', price=5000, owner_rating='3.10'
+        )
+
+    def _titles(self, min_rating):
+        response = self.client.get('/api/market/services/', {'min_rating': min_rating})
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['title'] for item in response.data['data'])
+
+    def test_filters_by_rating(self):
+        self.assertEqual(self._titles('4.5'), ['Лендинг'])
+
+    def test_invalid_values_are_ignored_alike(self):
+        for value in ('abc', 'NaN', 'Infinity', '-inf'):
+            with self.subTest(value=value):
+                self.assertEqual(self._titles(value), ['Лендинг', 'Логотип'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogCacheVersionTests(TestCase):
+    def test_evicted_version_never_goes_back(self):
+        first = catalog_cache._get_version()
+        catalog_cache._bump_version()
+        bumped = catalog_cache._get_version()
+        cache.delete(catalog_cache.VERSION_KEY)
+
+        self.assertGreater(bumped, first)
+        self.assertGreater(catalog_cache._get_version(), bumped)
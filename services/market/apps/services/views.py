@@ -5,9 +5,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, F, Prefetch
+from django.contrib.postgres.search import SearchRank, TrigramWordSimilarity
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
 from django.db import transaction
-from .models import Service, ServiceImage, Deal, Review, DealDeliveryAttachment, Favorite
+from django.conf import settings
+from .models import Service, ServiceImage, ServiceTag, Deal, Review, DealDeliveryAttachment, Favorite, WorkerRating
 from .serializers import (
     ServiceSerializer,
     ServiceImageSerializer,
@@ -15,14 +19,20 @@ from .serializers import (
     ReviewSerializer,
     CreateDealSerializer,
     CompleteDealSerializer,
-    FavoriteSerializer
+    FavoriteSerializer,
+    get_media_base_url,
 )
+from .pagination import ServiceCursorPagination
+from .search import build_search_query
+from . import catalog_cache, http_client
 from .throttling import AIGenerationThrottle, DealCreationThrottle, FileUploadThrottle, DealPaymentThrottle
 from .services import AIService
 from .deal_service import DealService
+from collections import Counter
 import os
-import requests
+import hashlib
 import magic
+from decimal import Decimal, InvalidOperation
 
 
 class ServiceViewSet(viewsets.ModelViewSet):
@@ -30,9 +40,21 @@ class ServiceViewSet(viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = ServiceCursorPagination
+
+    # Сортировки каталога; при пагинации курсор хранит все поля сортировки и id
+    SORT_ORDERINGS = {
+        'price_asc': ('price', '-created_at'),
+        'price_desc': ('-price', '-created_at'),
+        'popular': ('-favorites_count', '-created_at'),  # индекс is_active, -favorites_count, -created_at
+        'rating': ('-owner_rating', '-created_at'),  # индекс is_active, -owner_rating, -created_at
+        'relevance': ('-search_rank', '-created_at'),  # только вместе с search
+    }
+    DEFAULT_ORDERING = ('-created_at',)  # По умолчанию - новые первые
+    SUGGEST_CACHE_TIMEOUT = 300
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'get_subcategories']:
+        if self.action in ['list', 'retrieve', 'get_subcategories', 'suggest']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
@@ -40,6 +62,11 @@ class ServiceViewSet(viewsets.ModelViewSet):
         queryset = Service.objects.all()
         
         if self.action == 'list':
+            # Все изображения страницы одним запросом, в порядке отображения
+            queryset = queryset.prefetch_related(
+                Prefetch('images', queryset=ServiceImage.objects.order_by('order', 'created_at'))
+            )
+            
             owner_id = self.request.query_params.get('owner_id')
             
             if owner_id:
@@ -62,44 +89,99 @@ class ServiceViewSet(viewsets.ModelViewSet):
             subcat_list = subcats_param.split(',')
             queryset = queryset.filter(subcategory__in=subcat_list)
 
-        # Поиск
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(tags__contains=[search])
-            )
+        # Фильтрация по минимальному рейтингу владельца
+        min_rating = self.request.query_params.get('min_rating')
+        if min_rating:
+            try:
+                min_rating = Decimal(min_rating)
+            except InvalidOperation:
+                min_rating = None
+            # Некорректное значение игнорируется; Decimal принимает и NaN/Infinity,
+            # их отбрасываем так же, как нечисловой ввод
+            if min_rating is not None and min_rating.is_finite():
+                queryset = queryset.filter(owner_rating__gte=min_rating)
+
+        # Полнотекстовый поиск (tsvector + GIN, стемминг для русского языка)
+        search_query = self.get_search_query()
+        if search_query is not None:
+            queryset = queryset.filter(search_vector=search_query)
+        elif self.request.query_params.get('search'):
+            # В запросе нет ни одного слова - искать нечего
+            queryset = queryset.none()
 
         # Сортировка
         sort_by = self.request.query_params.get('sort', '-created_at')
         
-        if sort_by == 'price_asc':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_desc':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'popular':
-            # Сортировка по популярности (количество избранного)
-            queryset = queryset.annotate(
-                favorites_count=Count('favorited_by')
-            ).order_by('-favorites_count', '-created_at')
-        elif sort_by == 'rating':
-            # Сортировка по рейтингу владельца
-            queryset = queryset.annotate(
-                avg_rating=Avg('owner_id')  # Требует дополнительной логики
-            ).order_by('-created_at')  # Временно по дате
-        else:
-            # По умолчанию - новые первые
-            queryset = queryset.order_by('-created_at')
+        if sort_by == 'relevance' and search_query is not None:
+            # Сортировка по релевантности поискового запроса
+            queryset = queryset.annotate(search_rank=SearchRank(F('search_vector'), search_query))
+
+        queryset = queryset.order_by(*self.get_ordering())
 
         return queryset
 
+    def get_ordering(self):
+        sort_by = self.request.query_params.get('sort', '-created_at')
+        
+        if sort_by == 'relevance' and self.get_search_query() is None:
+            return self.DEFAULT_ORDERING
+        
+        return self.SORT_ORDERINGS.get(sort_by, self.DEFAULT_ORDERING)
+
+    def get_search_query(self):
+        search = self.request.query_params.get('search')
+        if not search:
+            return None
+        return build_search_query(search)
+
+    def get_listing_context(self, services):
+        """Контекст сериализатора для списка: данные по всей странице собираются заранее"""
+        context = self.get_serializer_context()
+        context['media_base_url'] = get_media_base_url(self.request)
+        
+        if self.request.user.is_authenticated:
+            context['favorited_ids'] = Favorite.get_favorited_ids(
+                self.request.user.id,
+                [service.id for service in services]
+            )
+        
+        return context
+
+    def _anonymous_cached(self, kind, build_response, extra=''):
+        """Ответ для анонимного посетителя берется из кэша каталога (Redis)"""
+        if self.request.user.is_authenticated:
+            return build_response()
+        
+        cached_data = catalog_cache.get_response(kind, self.request, extra)
+        if cached_data is not None:
+            return Response(cached_data)
+        
+        response = build_response()
+        if response.status_code == 200:
+            catalog_cache.set_response(kind, self.request, response.data, extra)
+        return response
+
     def list(self, request):
-        services = self.get_queryset()
-        serializer = self.get_serializer(services, many=True)
+        return self._anonymous_cached('list', self._build_list_response)
+
+    def _build_list_response(self):
+        queryset = self.get_queryset()
+        
+        # Курсорная пагинация, если клиент запросил страницу (cursor/page_size)
+        page = self.paginate_queryset(queryset)
+        services = page if page is not None else list(queryset)
+        
+        serializer = self.get_serializer(services, many=True, context=self.get_listing_context(services))
+        
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response({'status': 'success', 'data': serializer.data, 'error': None})
 
     def retrieve(self, request, pk=None):
+        return self._anonymous_cached('retrieve', self._build_retrieve_response, extra=str(pk))
+
+    def _build_retrieve_response(self):
+        request = self.request
         try:
             service = self.get_object()
             
@@ -119,6 +201,9 @@ class ServiceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='subcategories')
     def get_subcategories(self, request):
         """Получить список всех подкатегорий для всех категорий"""
+        return self._anonymous_cached('subcategories', self._build_subcategories_response)
+
+    def _build_subcategories_response(self):
         subcategories_data = {}
         
         for category_value, category_label in Service.CATEGORY_CHOICES:
@@ -134,6 +219,47 @@ class ServiceViewSet(viewsets.ModelViewSet):
             'error': None
         })
 
+    @action(detail=False, methods=['get'], url_path='suggest')
+    def suggest(self, request):
+        """Подсказки заголовков и тегов по мере ввода (pg_trgm, устойчиво к опечаткам)"""
+        query = ' '.join(request.query_params.get('q', '').lower().split())[:100]
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        
+        if len(query) < 2:
+            return Response({'status': 'success', 'data': {'titles': [], 'tags': []}, 'error': None})
+        
+        cache_key = f'service_suggest:{limit}:{hashlib.md5(query.encode()).hexdigest()}'
+        data = cache.get(cache_key)
+        
+        if data is None:
+            titles = Service.objects.filter(
+                is_active=True,
+                title__trigram_word_similar=query
+            ).annotate(
+                similarity=TrigramWordSimilarity(query, 'title')
+            ).order_by('-similarity', '-created_at').values('id', 'title')[:limit]
+            
+            tags = ServiceTag.objects.filter(
+                services_count__gt=0,
+                name__trigram_word_similar=query
+            ).annotate(
+                similarity=TrigramWordSimilarity(query, 'name')
+            ).order_by('-similarity', '-services_count').values_list('name', flat=True)[:limit]
+            
+            data = {
+                'titles': [{'id': str(item['id']), 'title': item['title']} for item in titles],
+                'tags': list(tags),
+            }
+            cache.set(cache_key, data, self.SUGGEST_CACHE_TIMEOUT)
+        
+        response = Response({'status': 'success', 'data': data, 'error': None})
+        patch_cache_control(response, public=True, max_age=self.SUGGEST_CACHE_TIMEOUT)
+        return response
+
     def _validate_image_file(self, image_file):
         """Валидация изображения с MIME-type проверкой"""
         if image_file.size > 5 * 1024 * 1024:
@@ -210,8 +336,11 @@ class ServiceViewSet(viewsets.ModelViewSet):
             owner_id=request.user.id,
             owner_name=request.data.get('owner_name', 'Фрилансер'),
             owner_avatar=request.data.get('owner_avatar', ''),
+            owner_rating=WorkerRating.get_avg_rating(request.user.id),
             is_active=final_is_active
         )
+        ServiceTag.track(set(), ServiceTag.counted_tags(service))
+        catalog_cache.invalidate()
         
         # Валидация и сохранение изображений
         for i in range(5):
@@ -289,7 +418,10 @@ class ServiceViewSet(viewsets.ModelViewSet):
                     'data': None
                 }, status=400)
 
+        previous_tags = ServiceTag.counted_tags(instance)
         service = serializer.save(is_active=final_is_active)
+        ServiceTag.track(previous_tags, ServiceTag.counted_tags(service))
+        catalog_cache.invalidate()
         
         # Валидация и обновление изображений
         for i in range(5):
@@ -319,7 +451,9 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if str(instance.owner_id) != str(request.user.id):
             return Response({'status': 'error', 'error': 'Нет прав', 'data': None}, status=403)
 
+        ServiceTag.track(ServiceTag.counted_tags(instance), set())
         instance.delete()
+        catalog_cache.invalidate()
         return Response({'status': 'success', 'data': {'message': 'Услуга удалена'}, 'error': None})
 
     @action(detail=True, methods=['delete'], url_path='delete-image/(?P<image_id>[^/.]+)')
@@ -332,6 +466,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
             
             image = ServiceImage.objects.get(id=image_id, service=service)
             image.delete()
+            catalog_cache.invalidate()
             
             return Response({'status': 'success', 'message': 'Изображение удалено'})
         except ServiceImage.DoesNotExist:
@@ -343,10 +478,17 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if request.user.role != 'worker':
             return Response({'status': 'error', 'error': 'Только для воркеров'}, status=403)
 
-        count = Service.objects.filter(
-            owner_id=request.user.id,
-            is_active=True
-        ).update(is_active=False)
+        with transaction.atomic():
+            services = list(Service.objects.select_for_update().filter(
+                owner_id=request.user.id,
+                is_active=True
+            ).only('id', 'tags', 'is_active'))
+            count = Service.objects.filter(id__in=[service.id for service in services]).update(is_active=False)
+            deltas = Counter()
+            for service in services:
+                deltas.update(ServiceTag.counted_tags(service))
+            ServiceTag.adjust_counts({name: -used for name, used in deltas.items()})
+        catalog_cache.invalidate()
 
         return Response({
             'status': 'success',
@@ -360,12 +502,12 @@ class ServiceViewSet(viewsets.ModelViewSet):
             auth_header = self.request.headers.get('Authorization', '')
             token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
             
-            subscription_url = 'http://localhost:8001/api/auth/subscription/'
+            subscription_url = f"{settings.AUTH_SERVICE_URL}/api/auth/subscription/"
             
-            response = requests.get(
+            response = http_client.get(
                 subscription_url,
-                headers={'Authorization': f'Bearer {token}'},
-                timeout=5
+                endpoint='auth.subscription',
+                headers={'Authorization': f'Bearer {token}'}
             )
             
             if response.status_code == 200:
@@ -387,9 +529,17 @@ class FavoriteViewSet(viewsets.ViewSet):
         """GET /api/market/favorites/ - получить избранное пользователя"""
         favorites = Favorite.objects.filter(
             user_id=request.user.id
-        ).select_related('service').order_by('-created_at')
+        ).select_related('service').prefetch_related(
+            Prefetch('service__images', queryset=ServiceImage.objects.order_by('order', 'created_at'))
+        ).order_by('-created_at')
         
-        serializer = FavoriteSerializer(favorites, many=True, context={'request': request})
+        # Все услуги в этом списке заведомо в избранном
+        context = {
+            'request': request,
+            'media_base_url': get_media_base_url(request),
+            'favorited_ids': {favorite.service_id for favorite in favorites},
+        }
+        serializer = FavoriteSerializer(favorites, many=True, context=context)
         
         return Response({
             'status': 'success',
@@ -418,10 +568,13 @@ class FavoriteViewSet(viewsets.ViewSet):
             }, status=404)
         
         # Проверяем, не добавлено ли уже
-        favorite, created = Favorite.objects.get_or_create(
-            user_id=request.user.id,
-            service=service
-        )
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(
+                user_id=request.user.id,
+                service=service
+            )
+            if created:
+                self._change_favorites_count(service.id, 1)
         
         if not created:
             return Response({
@@ -444,7 +597,11 @@ class FavoriteViewSet(viewsets.ViewSet):
                 user_id=request.user.id
             )
             
-            favorite.delete()
+            with transaction.atomic():
+                # Параллельный запрос мог уже удалить запись - счетчик уменьшает только удаливший
+                deleted, _ = Favorite.objects.filter(pk=favorite.pk).delete()
+                if deleted:
+                    self._change_favorites_count(favorite.service_id, -1)
             
             return Response({
                 'status': 'success',
@@ -486,7 +643,10 @@ class FavoriteViewSet(viewsets.ViewSet):
         
         if favorite:
             # Удаляем
-            favorite.delete()
+            with transaction.atomic():
+                deleted, _ = Favorite.objects.filter(pk=favorite.pk).delete()
+                if deleted:
+                    self._change_favorites_count(service.id, -1)
             return Response({
                 'status': 'success',
                 'data': {
@@ -497,10 +657,13 @@ class FavoriteViewSet(viewsets.ViewSet):
             })
         else:
             # Добавляем
-            favorite = Favorite.objects.create(
-                user_id=request.user.id,
-                service=service
-            )
+            with transaction.atomic():
+                favorite, created = Favorite.objects.get_or_create(
+                    user_id=request.user.id,
+                    service=service
+                )
+                if created:
+                    self._change_favorites_count(service.id, 1)
             return Response({
                 'status': 'success',
                 'data': {
@@ -512,6 +675,14 @@ class FavoriteViewSet(viewsets.ViewSet):
             }, status=201)
 
 
+    def _change_favorites_count(self, service_id, delta):
+        """Атомарно изменить денормализованный счетчик избранного услуги"""
+        queryset = Service.objects.filter(id=service_id)
+        if delta < 0:
+            queryset = queryset.filter(favorites_count__gt=0)
+        queryset.update(favorites_count=F('favorites_count') + delta)
+
+
 class DealViewSet(viewsets.ViewSet):
     """API для работы с заказами"""
     permission_classes = [IsAuthenticated]
@@ -565,9 +736,12 @@ class DealViewSet(viewsets.ViewSet):
             auth_header = request.headers.get('Authorization', '')
             token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
 
-            import requests as req
-            chat_url = f"http://localhost:8003/api/chat/rooms/{serializer.validated_data['chat_room_id']}/"
-            chat_response = req.get(chat_url, headers={'Authorization': f'Bearer {token}'})
+            chat_url = f"{settings.CHAT_SERVICE_URL}/api/chat/rooms/{serializer.validated_data['chat_room_id']}/"
+            chat_response = http_client.get(
+                chat_url,
+                endpoint='chat.room',
+                headers={'Authorization': f'Bearer {token}'}
+            )
 
             if chat_response.status_code != 200:
                 return Response({'error': 'Не удалось получить данные чата'}, status=400)
@@ -595,8 +769,7 @@ class DealViewSet(viewsets.ViewSet):
                 worker_id=worker_id,
                 title=serializer.validated_data['title'],
                 description=serializer.validated_data['description'],
-                price=serializer.validated_data['price'],
-                auth_token=token
+                price=serializer.validated_data['price']
             )
 
             return Response({
@@ -620,10 +793,7 @@ class DealViewSet(viewsets.ViewSet):
             if not new_price:
                 return Response({'error': 'Укажите новую цену'}, status=400)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.update_price(deal, str(request.user.id), new_price, token)
+            deal = DealService.update_price(deal, str(request.user.id), new_price)
 
             return Response({
                 'status': 'success',
@@ -642,10 +812,7 @@ class DealViewSet(viewsets.ViewSet):
         try:
             deal = Deal.objects.get(id=pk)
             
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.pay_deal(deal, str(request.user.id), token)
+            deal = DealService.pay_deal(deal, str(request.user.id))
 
             return Response({
                 'status': 'success',
@@ -678,10 +845,7 @@ class DealViewSet(viewsets.ViewSet):
                     content_type=file.content_type or 'application/octet-stream'
                 )
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.deliver_work(deal, str(request.user.id), delivery_message, token)
+            deal = DealService.deliver_work(deal, str(request.user.id), delivery_message)
 
             return Response({
                 'status': 'success',
@@ -701,10 +865,7 @@ class DealViewSet(viewsets.ViewSet):
             deal = Deal.objects.get(id=pk)
             revision_reason = request.data.get('revision_reason', '')
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.request_revision(deal, str(request.user.id), revision_reason, token)
+            deal = DealService.request_revision(deal, str(request.user.id), revision_reason)
 
             return Response({
                 'status': 'success',
@@ -727,15 +888,11 @@ class DealViewSet(viewsets.ViewSet):
             if not serializer.is_valid():
                 return Response({'error': serializer.errors}, status=400)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
             deal = DealService.complete_deal(
                 deal=deal,
                 client_id=str(request.user.id),
                 rating=serializer.validated_data['rating'],
-                comment=serializer.validated_data.get('comment', ''),
-                auth_token=token
+                comment=serializer.validated_data.get('comment', '')
             )
 
             return Response({
@@ -756,10 +913,7 @@ class DealViewSet(viewsets.ViewSet):
             deal = Deal.objects.get(id=pk)
             reason = request.data.get('reason', 'Не указана')
             
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.cancel_deal(deal, str(request.user.id), reason, token)
+            deal = DealService.cancel_deal(deal, str(request.user.id), reason)
 
             return Response({
                 'status': 'success',
@@ -813,10 +967,7 @@ class DealViewSet(viewsets.ViewSet):
             if not dispute_reason:
                 return Response({'error': 'Укажите причину спора'}, status=400)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.open_dispute(deal, str(request.user.id), dispute_reason, token)
+            deal = DealService.open_dispute(deal, str(request.user.id), dispute_reason)
 
             return Response({
                 'status': 'success',
@@ -835,10 +986,7 @@ class DealViewSet(viewsets.ViewSet):
         try:
             deal = Deal.objects.get(id=pk)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.worker_refund(deal, str(request.user.id), token)
+            deal = DealService.worker_refund(deal, str(request.user.id))
 
             return Response({
                 'status': 'success',
@@ -861,10 +1009,7 @@ class DealViewSet(viewsets.ViewSet):
             if not defense_text:
                 return Response({'error': 'Укажите аргументы защиты'}, status=400)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.worker_defend(deal, str(request.user.id), defense_text, token)
+            deal = DealService.worker_defend(deal, str(request.user.id), defense_text)
 
             return Response({
                 'status': 'success',
@@ -888,10 +1033,7 @@ class DealViewSet(viewsets.ViewSet):
             if not winner:
                 return Response({'error': 'Укажите победителя (client/worker)'}, status=400)
 
-            auth_header = request.headers.get('Authorization', '')
-            token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else ''
-
-            deal = DealService.admin_resolve_dispute(deal, winner, admin_comment, token)
+            deal = DealService.admin_resolve_dispute(deal, winner, admin_comment)
 
             return Response({
                 'status': 'success',
@@ -950,6 +1092,7 @@ class UpdateOwnerAvatarView(APIView):
             return Response({'error': 'Нет прав'}, status=403)
         
         count = Service.objects.filter(owner_id=owner_id).update(owner_avatar=owner_avatar)
+        catalog_cache.invalidate()
         
         return Response({
             'status': 'success',
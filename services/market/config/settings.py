@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',      
     'django.contrib.messages',      
     'django.contrib.staticfiles',   
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'apps.services',
@@ -71,6 +72,9 @@ STATIC_URL = 'static/'
 # Настройки медиа-файлов
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Публичный базовый URL медиа для списков (например, https://cdn.example.com/media/).
+# Если пусто - строится из запроса один раз на ответ.
+MEDIA_BASE_URL = os.getenv('MEDIA_BASE_URL', '')
 
 # Настройки загрузки файлов
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
@@ -124,3 +128,27 @@ USE_TZ = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CHAT_SERVICE_URL = os.getenv('CHAT_SERVICE_URL', 'http://localhost:8003')
+
+# Redis (тот же инстанс, что и у channel layer чата, отдельная БД)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'market',
+    }
+}
+
+# Время жизни кэша ответов каталога для анонимных посетителей (сек)
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Межсервисные HTTP-запросы (пул соединений, см. http_client.py)
+INTERNAL_HTTP_CONNECT_TIMEOUT = float(os.getenv('INTERNAL_HTTP_CONNECT_TIMEOUT', '2'))
+INTERNAL_HTTP_READ_TIMEOUT = float(os.getenv('INTERNAL_HTTP_READ_TIMEOUT', '5'))
+INTERNAL_HTTP_RETRIES = int(os.getenv('INTERNAL_HTTP_RETRIES', '2'))
+INTERNAL_HTTP_POOL_SIZE = int(os.getenv('INTERNAL_HTTP_POOL_SIZE', '10'))
+INTERNAL_HTTP_METRICS_INTERVAL = int(os.getenv('INTERNAL_HTTP_METRICS_INTERVAL', '300'))
+
+# Аренда события outbox на время отправки в чат (сек): после нее событие упавшего диспетчера отправляется повторно
+CHAT_OUTBOX_CLAIM_LEASE_SECONDS = int(os.getenv('CHAT_OUTBOX_CLAIM_LEASE_SECONDS', '120'))